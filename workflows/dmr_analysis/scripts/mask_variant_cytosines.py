@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+mask_variant_cytosines.py
+─────────────────────────
+Remove the cytosines whose sequence context (CpG, CHG, CHH) is altered by a
+variant called in the same strain, so that SNPs destroying or creating a
+methylation site are not reported as methylation differences by DSS.
+
+The coordinate-sorted multi-sample VCF (variant_analysis:
+all_strains_merged.vcf.gz) and the strain's bedMethyl (modkit pileup) are
+merge-joined in one streaming pass: both are ordered by reference contig
+(the ##contig order of the VCF header, or the order of the VCF records when
+the header has no ##contig lines) and position, so only the variants near
+the current cytosine are held in memory.
+
+A cytosine at 0-based position p occupies the context span
+  +  strand: [p, p + L)      −  strand: [p − L + 1, p + 1)
+  .  (strands combined, CpG):  [p, p + L)
+with L = 2 for CpG and 3 for CHG/CHH (--context-length). It is masked when
+the REF interval of a variant that the strain carries (GT has an ALT
+allele) overlaps that span.
+
+Outputs:
+  --output   bedMethyl without the masked cytosines ("-" = stdout, e.g. piped
+             into bedmethyl_to_dss.py)
+  --flagged  one row per masked cytosine with the overlapping variant
+  --report   per-contig counts of cytosines, masked cytosines and variants
+
+Usage:
+  python mask_variant_cytosines.py all_strains_merged.vcf.gz SBC4 r0066.bedMethyl \\
+      --output r0066.masked.bedMethyl --flagged r0066.variant_flagged.tsv \\
+      --report r0066.variant_mask_report.tsv [--context-length 3]
+"""
+
+import argparse
+import gzip
+import sys
+from collections import deque
+
+
+def open_text(path, mode="rt"):
+    if path == "-":
+        return sys.stdout if "w" in mode else sys.stdin
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+# ── VCF side ──────────────────────────────────────────────────────────────────
+
+def record_contig_order(vcf_path):
+    """{contig: rank} in the order the contigs first appear in the VCF records."""
+    order = {}
+    with open_text(vcf_path) as fh:
+        for line in fh:
+            if not line.startswith("#"):
+                order.setdefault(line.split("\t", 1)[0], len(order))
+    return order
+
+
+def carries_alt(gt):
+    """True when a GT string (0/1, 1|1, ./., 2 …) contains a non-reference allele."""
+    return any(a not in ("0", ".", "") for a in gt.replace("|", "/").split("/"))
+
+
+class StrainVariants:
+    """
+    Forward-only reader of the variants carried by one VCF sample, as
+    (contig, start, end, POS, REF, ALT, GT) with 0-based half-open REF
+    intervals.
+
+    Contigs are ranked by the ##contig header lines or, for a VCF without
+    them, by the order of its records (one extra pass over the file). Records
+    must be grouped by contig in that order; anything else raises ValueError
+    instead of silently dropping variants.
+    """
+
+    def __init__(self, vcf_path, sample):
+        self.fh = open_text(vcf_path)
+        self.contig_rank = {}
+        for line in self.fh:
+            if line.startswith("##contig=<"):
+                contig_id = line.split("ID=", 1)[1].split(",", 1)[0].rstrip(">\n")
+                self.contig_rank.setdefault(contig_id, len(self.contig_rank))
+            elif line.startswith("#CHROM"):
+                columns = line.rstrip("\n").split("\t")
+                if sample not in columns[9:]:
+                    raise ValueError(f"sample {sample!r} not in VCF (samples: {', '.join(columns[9:])})")
+                self.sample_col = columns.index(sample)
+                break
+        if not self.contig_rank:
+            self.contig_rank = record_contig_order(vcf_path)
+        self.last_rank = -1
+        self.pending = None
+        self.n_used = 0
+        self._advance()
+
+    def rank(self, contig):
+        """VCF order of a contig; contigs without variants in the VCF sort last."""
+        return self.contig_rank.get(contig, len(self.contig_rank))
+
+    def _advance(self):
+        for line in self.fh:
+            fields = line.rstrip("\n").split("\t")
+            if fields[0] not in self.contig_rank:
+                raise ValueError(f"VCF record on {fields[0]}, which has no ##contig header line")
+            rank = self.contig_rank[fields[0]]
+            if rank < self.last_rank:
+                raise ValueError(f"VCF records are not grouped by contig in header order ({fields[0]} at {fields[1]})")
+            self.last_rank = rank
+            fmt = fields[8].split(":")
+            if "GT" not in fmt:
+                continue
+            values = fields[self.sample_col].split(":")
+            gt = values[fmt.index("GT")] if fmt.index("GT") < len(values) else "."
+            if not carries_alt(gt):
+                continue
+            start = int(fields[1]) - 1
+            self.pending = (fields[0], start, start + len(fields[3]), fields[1], fields[3], fields[4], gt)
+            self.n_used += 1
+            return
+        self.pending = None
+
+    def skip_to(self, contig):
+        """Drop variants on contigs ordered before `contig`."""
+        if contig not in self.contig_rank:
+            return                 # no variants on this contig
+        while self.pending and self.pending[0] != contig and self.rank(self.pending[0]) < self.rank(contig):
+            self._advance()
+
+    def take_until(self, contig, end):
+        """Yield the variants of `contig` starting before `end`."""
+        if self.pending and self.pending[0] != contig and self.rank(self.pending[0]) < self.rank(contig):
+            raise ValueError(f"variant stream is still on {self.pending[0]} at {contig} "
+                             f"(skip_to({contig!r}) was not called)")
+        while self.pending and self.pending[0] == contig and self.pending[1] < end:
+            variant = self.pending
+            self._advance()
+            yield variant
+
+
+# ── bedMethyl side ────────────────────────────────────────────────────────────
+
+def context_span(start, strand, length):
+    if strand == "-":
+        return start - length + 1, start + 1
+    return start, start + length
+
+
+def mask_bedmethyl(bed_in, variants, context_length, out, flagged, report):
+    """
+    Stream the bedMethyl rows of `bed_in`, writing unmasked rows to `out`
+    and masked ones to `flagged`. Returns {contig: [cytosines, masked, variants]}.
+    """
+    stats = {}
+    active = deque()           # strain variants that may still overlap a cytosine
+    contig = None
+    flagged.write("chrom\tpos\tstrand\tN_valid_cov\tN_mod\tvariant_pos\tref\talt\tgt\n")
+
+    for line in bed_in:
+        if line.startswith("#"):
+            out.write(line)
+            continue
+        fields = line.rstrip("\n").split("\t")
+        chrom, start, strand = fields[0], int(fields[1]), fields[5]
+
+        if chrom != contig:
+            if contig is not None and chrom in variants.contig_rank and variants.rank(chrom) < variants.rank(contig):
+                raise ValueError(f"bedMethyl is not in VCF contig order: {chrom} after {contig}")
+            contig = chrom
+            active.clear()
+            variants.skip_to(contig)
+            stats[contig] = [0, 0, 0]
+        counts = stats[contig]
+        counts[0] += 1
+
+        span_start, span_end = context_span(start, strand, context_length)
+        for variant in variants.take_until(contig, span_end):
+            active.append(variant)
+            counts[2] += 1
+        # spans start at most L − 1 bases left of p, and p only grows
+        while active and active[0][2] <= start - context_length + 1:
+            active.popleft()
+
+        hit = next((v for v in active if v[1] < span_end and v[2] > span_start), None)
+        if hit is None:
+            out.write(line)
+        else:
+            counts[1] += 1
+            flagged.write(f"{chrom}\t{start + 1}\t{strand}\t{fields[9]}\t{fields[11]}\t"
+                          f"{hit[3]}\t{hit[4]}\t{hit[5]}\t{hit[6]}\n")
+
+    report.write("chrom\tcytosines\tmasked\tvariants_joined\n")
+    totals = [0, 0, 0]
+    for chrom, counts in stats.items():
+        report.write(f"{chrom}\t" + "\t".join(map(str, counts)) + "\n")
+        totals = [t + c for t, c in zip(totals, counts)]
+    report.write("total\t" + "\t".join(map(str, totals)) + "\n")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mask cytosines whose context is altered by a strain's variants")
+    parser.add_argument("vcf", help="coordinate-sorted (multi-sample) VCF, plain or bgzipped")
+    parser.add_argument("vcf_sample", help="VCF sample column of this strain")
+    parser.add_argument("bedmethyl", help="modkit pileup bedMethyl of the strain")
+    parser.add_argument("--output", required=True, help="masked bedMethyl ('-' = stdout)")
+    parser.add_argument("--flagged", required=True, help="TSV of masked cytosines")
+    parser.add_argument("--report", required=True, help="per-contig summary TSV")
+    parser.add_argument("--context-length", type=int, default=2,
+                        help="context span in bases: 2 = CpG, 3 = CHG/CHH (default: 2)")
+    args = parser.parse_args()
+
+    variants = StrainVariants(args.vcf, args.vcf_sample)
+    with open_text(args.bedmethyl) as bed_in, \
+         open_text(args.output, "wt") as out, \
+         open(args.flagged, "w") as flagged, \
+         open(args.report, "w") as report:
+        stats = mask_bedmethyl(bed_in, variants, args.context_length, out, flagged, report)
+
+    n = sum(c[0] for c in stats.values())
+    masked = sum(c[1] for c in stats.values())
+    print(f"[mask_variant_cytosines] {args.vcf_sample}: masked {masked:,} of {n:,} cytosines "
+          f"({variants.n_used:,} strain variants) → {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
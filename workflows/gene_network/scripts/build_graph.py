@@ -9,9 +9,14 @@
 # 
 
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import networkx as nx
+import scipy.sparse as sp
+import hashlib
+import json
 import pickle
+import shutil
 import argparse
 
 WDIR = Path(__file__).resolve().parents[3]
@@ -22,6 +27,39 @@ sbi_coex_dir = WDIR / 'data/reference/sbi_coex'
 # helpers
 # ---------------------------------------------------------------------------
 
+def read_coex_file(file, K, minZ):
+    '''
+    read one ATTED-II style per-gene file and keep only the top K coexpressed
+    genes with a certain min Z score. Returns {v: z}; if a gene is listed twice
+    the stronger z-score is kept (the same rule build_graph applies)
+    '''
+    df = pd.read_csv(file, sep='\t', header=None, names=['v', 'z'])
+    df['v'] = df['v'].astype(str)
+
+    # from each file, filter top K coexpressed genes & with a certain min Z score
+    df = df.nlargest(K, 'z')
+    df = df[df['z'] >= minZ]
+
+    out = {}
+    for v, z in zip(df['v'], df['z']):
+        z = float(z)
+        if v not in out or z > out[v]:
+            out[v] = z
+    return out
+
+def coexdir_to_edge_store(coex_dir, K, minZ):
+    '''
+    read every file of the coexpression directory into an edge store:
+    {u: {v: z}}, u being the gene named by the file (file stem)
+    '''
+    return {str(file.stem): read_coex_file(file, K, minZ) for file in coex_dir.glob('*')}
+
+def store_to_edgeslist(store):
+    '''
+    flatten an edge store into a list of (u, v, z) edges
+    '''
+    return [(u, v, z) for u, targets in store.items() for v, z in targets.items()]
+
 def coexdir_to_edgeslist(coex_dir, K, minZ):
     '''
     create a function that opens an ATTED-II style gene coexpression directory,
@@ -30,23 +68,7 @@ def coexdir_to_edgeslist(coex_dir, K, minZ):
     store the final content as an edge-list
     u-v has z weight: gene u and gene v is co-expressed with a value of z (z-score)
     '''
-    edges = []
-
-    for file in coex_dir.glob('*'):
-        u = str(file.stem)
-        # temporary df, rewritten every iteration of for loop
-        df = pd.read_csv(file, sep='\t', header=None, names=['v', 'z'])
-        df['v'] = df['v'].astype(str)
-
-        # from each file, filter top K coexpressed genes & with a certain min Z score
-        df = df.nlargest(K, 'z')
-        df = df[df['z'] >= minZ]    
-
-        # store to a list
-        for v, z in zip(df['v'], df['z']):
-            edges.append((u, v, float(z)))
-    
-    return edges
+    return store_to_edgeslist(coexdir_to_edge_store(coex_dir, K, minZ))
 
 def build_graph(edges):
     '''
@@ -64,19 +86,135 @@ def build_graph(edges):
 
     return G
 
+def graph_to_sparse(G, weight='weight'):
+    '''
+    convert the graph into a symmetric scipy.sparse CSR adjacency matrix
+    holding the edge weights (z-scores). Row/column i corresponds to nodes[i],
+    so downstream matrix results can be mapped back to gene IDs
+    '''
+    nodes = list(G.nodes())
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight=weight, format='csr')
+    return sp.csr_matrix(A, dtype=np.float64), nodes
+
 def save_object(pyobj, pklobj):
     with open(pklobj, 'wb') as f:
         pickle.dump(pyobj, f)
 
+def load_object(pklobj):
+    with open(pklobj, 'rb') as f:
+        return pickle.load(f)
+
+# ---------------------------------------------------------------------------
+# incremental rebuild
+# ---------------------------------------------------------------------------
+
+def file_digest(file, chunk_size=1 << 20):
+    '''
+    content hash of a coexpression file
+    '''
+    h = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def scan_coexdir(coex_dir, manifest=None):
+    """
+    Build the manifest entry of every file in coex_dir.
+
+    Files whose size and mtime match the previous manifest reuse its digest,
+    so only touched files are re-hashed.
+
+    Returns
+    -------
+    dict[str, dict] : file name -> {'size', 'mtime_ns', 'digest'}
+    """
+    previous = (manifest or {}).get('files', {})
+    entries = {}
+    for file in coex_dir.glob('*'):
+        st = file.stat()
+        old = previous.get(file.name)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            entries[file.name] = old
+        else:
+            entries[file.name] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                  'digest': file_digest(file)}
+    return entries
+
+def incremental_update(store, manifest, coex_dir, K, minZ):
+    """
+    Patch the edge store for the files that changed since the manifest was
+    written and rebuild the graph from it. Only added/changed files are
+    re-read; the entries of changed or removed files are replaced or dropped.
+    The store is put back into the file order of coex_dir before build_graph,
+    so nodes, edges, weights and their order equal a full rebuild (and hence
+    graph_to_sparse indices and everything derived from them downstream).
+
+    Returns
+    -------
+    (G, store, new_manifest, changed_files)
+    """
+    files = scan_coexdir(coex_dir, manifest)
+    old_files = manifest['files']
+
+    changed = [name for name, e in files.items()
+               if name not in old_files or old_files[name]['digest'] != e['digest']]
+    removed = [name for name in old_files if name not in files]
+
+    for name in removed:
+        store.pop(Path(name).stem, None)
+    for name in changed:
+        store[Path(name).stem] = read_coex_file(coex_dir / name, K, minZ)
+
+    # same order as coexdir_to_edge_store (scan_coexdir walks coex_dir.glob('*') too)
+    store = {Path(name).stem: store[Path(name).stem] for name in files}
+    G = build_graph(store_to_edgeslist(store))
+
+    new_manifest = {'K': K, 'minZ': minZ, 'files': files}
+    return G, store, new_manifest, changed + removed
+
 # ---------------------------------------------------------------------------
 # main
 # ---------------------------------------------------------------------------
 
-def main(coex_dir, output_filename, K, minZ):
-    edges = coexdir_to_edgeslist(coex_dir, K, minZ)
-    G = build_graph(edges)
+def state_paths(output_filename):
+    '''
+    manifest and edge store written next to the graph pickle
+    '''
+    return output_filename.with_suffix('.manifest.json'), output_filename.with_suffix('.edges.pkl')
+
+def main(coex_dir, output_filename, K, minZ, incremental=False, state_dir=None):
+    manifest_path, store_path = state_paths(output_filename)
+    # previous state: the files next to the output, or the copies in state_dir
+    # (Snakemake deletes a rule's outputs before rerunning it)
+    prev_manifest_path, prev_store_path = (
+        (state_dir / manifest_path.name, state_dir / store_path.name) if state_dir
+        else (manifest_path, store_path))
+
+    manifest = None
+    if incremental and prev_manifest_path.exists() and prev_store_path.exists():
+        manifest = json.loads(prev_manifest_path.read_text())
+        if manifest['K'] != K or manifest['minZ'] != minZ:
+            print("Filtering parameters differ from the stored manifest, doing a full rebuild")
+            manifest = None
+
+    if manifest is None:
+        store = coexdir_to_edge_store(coex_dir, K, minZ)
+        G = build_graph(store_to_edgeslist(store))
+        manifest = {'K': K, 'minZ': minZ, 'files': scan_coexdir(coex_dir)}
+    else:
+        store = load_object(prev_store_path)
+        G, store, manifest, changed = incremental_update(store, manifest, coex_dir, K, minZ)
+        print(f"Incremental update: {len(changed)} changed/added/removed coexpression file(s)")
 
+    print(f"Graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
     save_object(G, output_filename)
+    save_object(store, store_path)
+    manifest_path.write_text(json.dumps(manifest))
+    if state_dir:
+        state_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(store_path, state_dir / store_path.name)
+        shutil.copyfile(manifest_path, state_dir / manifest_path.name)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Create coexpression network')
@@ -108,10 +246,21 @@ if __name__ == '__main__':
         default=None,
         help='Output path for the graph pickle (.pkl)'
     )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Re-read only coexpression files that changed since the last build (uses the .manifest.json next to the output)'
+    )
+    parser.add_argument(
+        '--state-dir',
+        type=Path,
+        default=None,
+        help='Directory keeping a copy of the manifest and edge store between runs (read by --incremental instead of the files next to the output)'
+    )
     args = parser.parse_args()
 
     K = args.gene_no
     minZ = args.z_score
     output = args.output or WDIR / f'results/gene_network/sbi_G-z{minZ}_k{K}.pkl'
 
-    main(args.coex_dir, output, K, minZ)
\ No newline at end of file
+    main(args.coex_dir, output, K, minZ, args.incremental, args.state_dir)
\ No newline at end of file
@@ -0,0 +1,229 @@
+# workflows/gene_network/scripts/cluster_graph.py
+#
+# Cluster the annotated co-expression graph with Markov clustering (MCL) on a
+# scipy.sparse adjacency matrix, then summarise the seed pathway content of
+# every cluster. Replaces the manual cluster hunting in Cytoscape.
+#
+# Usage: (via main snakefile) or run
+#       python3 cluster_graph.py --graph-pickle {annotated_graph_object} --inflation 2.0
+#
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import pickle
+import argparse
+
+from build_graph import graph_to_sparse
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def normalize_columns(M):
+    '''
+    make M column-stochastic (every non-empty column sums to 1)
+    '''
+    col_sums = np.asarray(M.sum(axis=0)).ravel()
+    inv = np.divide(1.0, col_sums, out=np.zeros_like(col_sums), where=col_sums > 0)
+    return sp.csr_matrix(M @ sp.diags(inv))
+
+def add_self_loops(A):
+    '''
+    add a self loop to every node, weighted by the strongest edge of that node,
+    so MCL does not oscillate between neighbours (standard MCL practice)
+    '''
+    loops = np.asarray(A.max(axis=0).todense()).ravel()
+    loops[loops == 0] = 1.0     # isolated node: keep it as its own attractor
+    return sp.csr_matrix(A + sp.diags(loops))
+
+def markov_clustering(A, inflation=2.0, expansion=2, prune=1e-4, max_iter=100, tol=1e-6):
+    """
+    Run MCL on a weighted adjacency matrix using only sparse matrix operations.
+
+    Each iteration is expansion (sparse matrix power), inflation (element-wise
+    power on the stored values), column normalisation and pruning of entries
+    below `prune` to keep the matrix sparse on the genome-wide network.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix
+        Symmetric non-negative adjacency (e.g. from graph_to_sparse()).
+    inflation : float
+        Inflation exponent; higher values give smaller, tighter clusters.
+    expansion : int
+        Number of random-walk steps per iteration.
+    prune : float
+        Transition probabilities below this value are dropped.
+    max_iter : int
+        Upper bound on the number of iterations.
+    tol : float
+        Convergence threshold on the largest absolute change.
+
+    Returns
+    -------
+    np.ndarray of int, one cluster label per row of A. Labels are ordered by
+    cluster size (0 = largest cluster).
+    """
+    A = sp.csr_matrix(A, dtype=np.float64)
+    A.data[A.data < 0] = 0      # MCL needs non-negative transition weights
+    A.eliminate_zeros()
+
+    M = normalize_columns(add_self_loops(A))
+
+    for i in range(max_iter):
+        last = M
+
+        # expansion
+        for _ in range(expansion - 1):
+            M = M @ last
+
+        # inflation + pruning
+        M = sp.csr_matrix(M)
+        M.data **= inflation
+        M = normalize_columns(M)
+        M.data[M.data < prune] = 0
+        M.eliminate_zeros()
+        M = normalize_columns(M)
+
+        delta = abs(M - last).max() if M.nnz or last.nnz else 0.0
+        if delta < tol:
+            print(f"MCL converged after {i + 1} iterations")
+            break
+    else:
+        print(f"MCL stopped after {max_iter} iterations without converging (delta={delta:.2e})")
+
+    # each node joins the attractor that holds the most of its flow
+    attractor = np.asarray(M.argmax(axis=0)).ravel()
+
+    # relabel attractors as 0..C-1 by cluster size (largest first)
+    _, inverse, counts = np.unique(attractor, return_inverse=True, return_counts=True)
+    order = np.argsort(-counts, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse]
+
+def cluster_assignments(G, labels, nodes):
+    '''
+    tabulate the cluster label of every node along with its pathway annotation
+    '''
+    pathway = [G.nodes[n].get('pathway', 'background') for n in nodes]
+    df = pd.DataFrame({'gene_id': nodes, 'cluster': labels, 'pathway': pathway})
+    return df.sort_values(['cluster', 'gene_id'], ignore_index=True)
+
+def summarize_clusters(assign_df):
+    """
+    Summarise the seed pathway content of every cluster.
+
+    Seed genes annotated with several pathways (comma-joined by
+    annotate_graph) are counted once for each of their pathways.
+
+    Returns
+    -------
+    pd.DataFrame with columns: cluster, size, n_seed, seed_pathways, seed_genes
+    Sorted so clusters holding the most seed genes come first.
+    """
+    sizes = assign_df.groupby('cluster').size().rename('size')
+
+    seeds = assign_df[assign_df['pathway'] != 'background']
+    n_seed = seeds.groupby('cluster').size().rename('n_seed')
+
+    per_pathway = (
+        seeds.assign(pathway=seeds['pathway'].str.split(','))
+        .explode('pathway')
+        .groupby(['cluster', 'pathway']).size()
+        .rename('n')
+        .reset_index()
+    )
+    seed_pathways = (
+        per_pathway.assign(label=per_pathway['pathway'] + ':' + per_pathway['n'].astype(str))
+        .groupby('cluster')['label'].agg(','.join)
+        .rename('seed_pathways')
+    )
+    seed_genes = seeds.groupby('cluster')['gene_id'].agg(','.join).rename('seed_genes')
+
+    summary = pd.concat([sizes, n_seed, seed_pathways, seed_genes], axis=1).reset_index()
+    summary['n_seed'] = summary['n_seed'].fillna(0).astype(int)
+    summary[['seed_pathways', 'seed_genes']] = summary[['seed_pathways', 'seed_genes']].fillna('')
+
+    return summary.sort_values(['n_seed', 'size'], ascending=False, ignore_index=True)
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main(graph_pickle, output_filename, summary_filename, inflation, expansion, prune, max_iter):
+    # load annotated graph
+    with open(graph_pickle, 'rb') as f:
+        G = pickle.load(f)
+    print(f"Loaded graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    A, nodes = graph_to_sparse(G)
+    labels = markov_clustering(A, inflation=inflation, expansion=expansion,
+                               prune=prune, max_iter=max_iter)
+
+    assign_df = cluster_assignments(G, labels, nodes)
+    summary_df = summarize_clusters(assign_df)
+    print(f"Found {summary_df.shape[0]} clusters, "
+          f"{(summary_df['n_seed'] > 0).sum()} of them containing seed genes")
+
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+    assign_df.to_csv(output_filename, sep='\t', index=False)
+    print(f"Cluster assignments saved to: {output_filename}")
+
+    summary_df.to_csv(summary_filename, sep='\t', index=False)
+    print(f"Cluster summary saved to: {summary_filename}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Markov clustering of the annotated co-expression graph')
+    parser.add_argument(
+        '--graph-pickle', '-g',
+        type=Path,
+        required=True,
+        help='Path to the annotated graph pickle produced by load_annotate_seed_genes.py'
+    )
+    parser.add_argument(
+        '--inflation', '-i',
+        type=float,
+        default=2.0,
+        help='MCL inflation parameter; higher values give smaller clusters'
+    )
+    parser.add_argument(
+        '--expansion', '-e',
+        type=int,
+        default=2,
+        help='MCL expansion parameter (random-walk steps per iteration)'
+    )
+    parser.add_argument(
+        '--prune',
+        type=float,
+        default=1e-4,
+        help='Drop transition probabilities below this value after each iteration'
+    )
+    parser.add_argument(
+        '--max-iter',
+        type=int,
+        default=100,
+        help='Maximum number of MCL iterations'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        type=Path,
+        default=None,
+        help='Output path for the cluster assignment table (.clusters.tsv)'
+    )
+    parser.add_argument(
+        '--summary-output', '-s',
+        type=Path,
+        default=None,
+        help='Output path for the per-cluster summary table (.cluster_summary.tsv)'
+    )
+    args = parser.parse_args()
+
+    output = args.output or args.graph_pickle.with_suffix('.clusters.tsv')
+    summary_output = args.summary_output or args.graph_pickle.with_suffix('.cluster_summary.tsv')
+
+    main(args.graph_pickle, output, summary_output, args.inflation, args.expansion, args.prune, args.max_iter)
@@ -0,0 +1,192 @@
+# workflows/gene_network/scripts/export_cytoscape.py
+#
+# Export the annotated co-expression graph (or the neighbourhood of its seed
+# genes) to files Cytoscape imports natively: SIF, node/edge table TSV and
+# CX2 JSON. Edges and node attributes are streamed straight from the graph to
+# disk, so no py4cytoscape session or Jupyter notebook is needed.
+#
+# Usage: (via main snakefile) or run
+#       python3 export_cytoscape.py --graph-pickle {annotated_graph_object} --neighbourhood 1 \
+#           --output-prefix results/gene_network/cytoscape/sbi_G_annotated-z4.0_k10
+#
+
+from pathlib import Path
+import pandas as pd
+import json
+import pickle
+import argparse
+
+FORMATS = ['sif', 'tsv', 'cx2']
+INTERACTION = 'co'      # edge type: co-expressed
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def seed_neighbourhood(G, hops):
+    '''
+    seed genes (pathway != background) plus every gene within `hops` edges
+    of them; hops=0 keeps only the seeds
+    '''
+    keep = {n for n, p in G.nodes(data='pathway') if p not in (None, 'background')}
+    frontier = keep
+    for _ in range(hops):
+        frontier = {nb for n in frontier for nb in G.adj[n]} - keep
+        keep |= frontier
+    return keep
+
+def attach_clusters(G, clusters_tsv):
+    '''
+    copy the MCL cluster label (cluster_graph.py output) onto the graph nodes
+    '''
+    clusters = pd.read_csv(clusters_tsv, sep='\t', dtype={'gene_id': str})
+    for gene_id, cluster in zip(clusters['gene_id'], clusters['cluster']):
+        if gene_id in G:
+            G.nodes[gene_id]['cluster'] = int(cluster)
+
+def node_attribute_types(G):
+    '''
+    CX2 data type of every node attribute, inferred from its first value
+    '''
+    cx_types = {bool: 'boolean', int: 'long', float: 'double', str: 'string'}
+    types = {}
+    for _, data in G.nodes(data=True):
+        for key, value in data.items():
+            if key not in types:
+                types[key] = cx_types.get(type(value), 'string')
+    return types
+
+def write_sif(G, path):
+    '''
+    one line per edge, then a single-name line per node without edges so
+    that isolated nodes (e.g. unconnected seeds) are imported as well
+    '''
+    with open(path, 'w') as f:
+        for u, v in G.edges():
+            f.write(f"{u}\t{INTERACTION}\t{v}\n")
+        for n in G.nodes():
+            if G.degree(n) == 0:
+                f.write(f"{n}\n")
+
+def write_tables(G, edges_path, nodes_path, attrs):
+    with open(edges_path, 'w') as f:
+        f.write("source\ttarget\tinteraction\tweight\n")
+        for u, v, w in G.edges(data='weight'):
+            f.write(f"{u}\t{v}\t{INTERACTION}\t{w}\n")
+
+    with open(nodes_path, 'w') as f:
+        f.write('\t'.join(['name'] + attrs) + '\n')
+        for n, data in G.nodes(data=True):
+            f.write('\t'.join([str(n)] + [str(data.get(a, '')) for a in attrs]) + '\n')
+
+def write_cx2(G, path, attr_types, network_name):
+    """
+    Stream G as a CX2 (Cytoscape Exchange 2.0) JSON document.
+
+    Nodes get consecutive integer ids; the 'interaction' edge attribute is
+    declared once with a default value instead of being repeated per edge.
+    """
+    node_ids = {n: i for i, n in enumerate(G.nodes())}
+    declarations = {
+        'networkAttributes': {'name': {'d': 'string'}},
+        'nodes': {'name': {'d': 'string'}, **{a: {'d': t} for a, t in attr_types.items()}},
+        'edges': {'interaction': {'d': 'string', 'v': INTERACTION}, 'weight': {'d': 'double'}},
+    }
+    meta = [
+        {'name': 'attributeDeclarations', 'elementCount': 1},
+        {'name': 'networkAttributes', 'elementCount': 1},
+        {'name': 'nodes', 'elementCount': G.number_of_nodes()},
+        {'name': 'edges', 'elementCount': G.number_of_edges()},
+    ]
+
+    with open(path, 'w') as f:
+        f.write('[{"CXVersion":"2.0","hasFragments":false},\n')
+        f.write('{"metaData":' + json.dumps(meta) + '},\n')
+        f.write('{"attributeDeclarations":[' + json.dumps(declarations) + ']},\n')
+        f.write('{"networkAttributes":[' + json.dumps({'name': network_name}) + ']},\n')
+
+        f.write('{"nodes":[')
+        for i, (n, data) in enumerate(G.nodes(data=True)):
+            values = json.dumps({'name': str(n), **{a: data[a] for a in attr_types if a in data}})
+            f.write(f'{"," if i else ""}\n{{"id":{node_ids[n]},"v":{values}}}')
+        f.write(']},\n')
+
+        f.write('{"edges":[')
+        for i, (u, v, w) in enumerate(G.edges(data='weight')):
+            f.write(f'{"," if i else ""}\n{{"id":{i},"s":{node_ids[u]},"t":{node_ids[v]},"v":{{"weight":{float(w)!r}}}}}')
+        f.write(']},\n')
+
+        f.write('{"status":[{"error":"","success":true}]}]\n')
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main(graph_pickle, output_prefix, formats, hops, clusters_tsv):
+    # load annotated graph
+    with open(graph_pickle, 'rb') as f:
+        G = pickle.load(f)
+    print(f"Loaded graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    if clusters_tsv:
+        attach_clusters(G, clusters_tsv)
+
+    # subgraph views stream from the original adjacency; nothing is copied
+    if hops is not None:
+        G = G.subgraph(seed_neighbourhood(G, hops))
+        print(f"Seed neighbourhood ({hops} hop(s)): {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    attr_types = node_attribute_types(G)
+    output_prefix.parent.mkdir(parents=True, exist_ok=True)
+    out = lambda ext: output_prefix.with_name(f"{output_prefix.name}.{ext}")
+
+    if 'sif' in formats:
+        write_sif(G, out('sif'))
+        print(f"SIF saved to: {out('sif')}")
+    if 'tsv' in formats:
+        write_tables(G, out('edges.tsv'), out('nodes.tsv'), list(attr_types))
+        print(f"Edge/node tables saved to: {out('edges.tsv')}, {out('nodes.tsv')}")
+    if 'cx2' in formats:
+        write_cx2(G, out('cx2'), attr_types, output_prefix.name)
+        print(f"CX2 saved to: {out('cx2')}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Export the annotated co-expression graph to Cytoscape-ready files')
+    parser.add_argument(
+        '--graph-pickle', '-g',
+        type=Path,
+        required=True,
+        help='Path to the annotated graph pickle produced by load_annotate_seed_genes.py'
+    )
+    parser.add_argument(
+        '--formats', '-f',
+        nargs='+',
+        default=FORMATS,
+        choices=FORMATS,
+        help='Formats to write: sif (.sif), tsv (.edges.tsv + .nodes.tsv), cx2 (.cx2)'
+    )
+    parser.add_argument(
+        '--neighbourhood', '-n',
+        type=int,
+        default=None,
+        help='Only export seed genes and genes within this many edges of them (default: whole graph)'
+    )
+    parser.add_argument(
+        '--clusters', '-c',
+        type=Path,
+        default=None,
+        help='Optional cluster assignment table from cluster_graph.py, added as a "cluster" node attribute'
+    )
+    parser.add_argument(
+        '--output-prefix', '-o',
+        type=Path,
+        default=None,
+        help='Output path prefix; format extensions are appended (default: graph pickle path without .pkl)'
+    )
+    args = parser.parse_args()
+
+    output_prefix = args.output_prefix or args.graph_pickle.with_suffix('')
+
+    main(args.graph_pickle, output_prefix, args.formats, args.neighbourhood, args.clusters)
@@ -13,6 +13,7 @@ import argparse
 
 WDIR = Path(__file__).resolve().parents[3]
 HMM_RESULTS = WDIR / 'results/hmm_homology'
+HIT_INDEX_NAME = 'homologous_geneID_index.tsv'
 
 # ---------------------------------------------------------------------------
 # helper functions
@@ -25,11 +26,47 @@ def parse_graph_pickle_filename(graph_pickle):
     K = info.split('_')[1].replace('k', '')
     return minZ, K
 
-def gather_top_hits(pathways, option, results_dir=HMM_RESULTS):
+def scan_hit_files(results_dir):
     """
-    Scan results_dir for subdirectories matching any of the given pathways,
-    load the *-07-homologous_geneID.txt file from each, and return a
-    combined DataFrame of seed gene IDs.
+    Fallback for results directories without a hit index: walk every
+    subdirectory, read its *-07-homologous_geneID.txt and build the same
+    table the index holds (pathway, KO, gene_id, evalue, rank, source).
+    """
+    records = []
+
+    for ko_dir in sorted(results_dir.iterdir()):
+        if not ko_dir.is_dir():
+            continue
+
+        hit_files = list(ko_dir.glob('*-07-homologous_geneID.txt'))
+        if not hit_files or hit_files[0].stat().st_size == 0:
+            continue
+
+        df = pd.read_csv(hit_files[0], sep='\t', dtype={'gene_id': str})
+        if df.empty:
+            continue
+
+        # derive pathway tag from directory name  (e.g. "map00020-K00025_kegg" → "map00020")
+        source = ko_dir.name.replace('_kegg', '')
+        records.append(pd.DataFrame({
+            'pathway': ko_dir.name.split('-')[0],
+            'KO': source.split('-')[1] if ko_dir.name.endswith('_kegg') and '-' in source else '',
+            'gene_id': df['gene_id'].values,
+            'evalue': df['evalue'].astype(float).values,
+            'rank': range(1, len(df) + 1),
+            'source': source,
+        }))
+
+    return pd.concat(records, ignore_index=True) if records else pd.DataFrame(
+        columns=['pathway', 'KO', 'gene_id', 'evalue', 'rank', 'source'])
+
+
+def gather_top_hits(pathways, option, results_dir=HMM_RESULTS, max_evalue=1e-5):
+    """
+    Select seed gene IDs for the given pathways from the consolidated hit
+    index (results_dir/homologous_geneID_index.tsv, maintained by the
+    hmm_homology workflow). Falls back to scanning the per-KO
+    *-07-homologous_geneID.txt files when no index exists.
 
     Parameters
     ----------
@@ -38,56 +75,43 @@ def gather_top_hits(pathways, option, results_dir=HMM_RESULTS):
         Pass ['all'] to include every subdirectory.
     option : str
         'top_only'    : keep only the single best-evalue hit per KO
-        'low_evalues' : (not yet implemented)
+        'low_evalues' : keep every hit with evalue <= max_evalue
     results_dir : Path
         Root directory containing per-KO subdirectories.
+    max_evalue : float
+        E-value cut-off for the 'low_evalues' option.
 
     Returns
     -------
     pd.DataFrame with columns: gene_id, evalue, source, pathway
     """
 
-    if option == 'low_evalues':
-        raise NotImplementedError("Option 'low_evalues' will be implemented later")
-    if option != 'top_only':
+    if option not in ('top_only', 'low_evalues'):
         raise ValueError("Options available: 'top_only' and 'low_evalues'")
 
-    records = []
-
-    for ko_dir in sorted(results_dir.iterdir()):
-        if not ko_dir.is_dir():
-            continue
+    index_path = results_dir / HIT_INDEX_NAME
+    if index_path.exists():
+        hits = pd.read_csv(index_path, sep='\t', dtype={'gene_id': str, 'KO': str}, keep_default_na=False)
+    else:
+        print(f"No hit index at {index_path}; scanning {results_dir} instead")
+        hits = scan_hit_files(results_dir)
 
-        # filter by pathway prefix unless 'all' is requested
-        if pathways != ['all'] and not any(ko_dir.name.startswith(p) for p in pathways):
-            continue
+    # filter by pathway prefix unless 'all' is requested
+    if pathways != ['all']:
+        hits = hits[hits['source'].str.startswith(tuple(pathways))]
 
-        hit_files = list(ko_dir.glob('*-07-homologous_geneID.txt'))
-        if not hit_files:
-            continue
+    if option == 'top_only':
+        hits = hits[hits['rank'] == 1]
+    else:
+        hits = hits[hits['evalue'].astype(float) <= max_evalue]
 
-        df = pd.read_csv(hit_files[0], sep='\t')
-        if df.empty:
-            continue
-
-        if option == 'top_only':
-            df = df.iloc[[0]].copy()
-
-        # derive pathway tag from directory name  (e.g. "map00020-K00025_kegg" → "map00020")
-        pathway_tag = ko_dir.name.split('-')[0]
-        source = ko_dir.name.replace('_kegg', '')
-
-        df['source'] = source
-        df['pathway'] = pathway_tag
-
-        records.append(df[['gene_id', 'evalue', 'source', 'pathway']])
-
-    if not records:
+    if hits.empty:
         raise FileNotFoundError(
-            f"No homologous_geneID files found in {results_dir} for pathways: {pathways}"
+            f"No homologous_geneID hits found in {results_dir} for pathways: {pathways}"
         )
 
-    return pd.concat(records, ignore_index=True)
+    hits = hits.sort_values(['source', 'rank'])
+    return hits[['gene_id', 'evalue', 'source', 'pathway']].reset_index(drop=True)
 
 
 def annotate_graph(G, seed_genes_df):
@@ -138,14 +162,14 @@ def annotate_graph(G, seed_genes_df):
 # main
 # ---------------------------------------------------------------------------
 
-def main(graph_pickle, pathways, output_filename, option):
+def main(graph_pickle, pathways, output_filename, option, max_evalue):
     # load graph
     with open(graph_pickle, 'rb') as f:
         G = pickle.load(f)
     print(f"Loaded graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
 
     # gather seed genes
-    seed_genes_df = gather_top_hits(pathways, option)
+    seed_genes_df = gather_top_hits(pathways, option, max_evalue=max_evalue)
     print(f"Seed genes collected: {len(seed_genes_df)} rows across pathways {pathways}")
 
     # annotate
@@ -185,6 +209,12 @@ if __name__ == '__main__':
         choices=['top_only', 'low_evalues'],
         help='How many hits to use per KO: "top_only" (best hit) or "low_evalues" (all significant hits)'
     )
+    parser.add_argument(
+        '--max-evalue', '-e',
+        type=float,
+        default=1e-5,
+        help='E-value cut-off for the "low_evalues" option'
+    )
     parser.add_argument(
         '--output', '-o',
         type=Path,
@@ -197,4 +227,4 @@ if __name__ == '__main__':
         minZ, K = parse_graph_pickle_filename(args.graph_pickle)
         args.output = args.graph_pickle.parent / f"sbi_G_annotated-z{minZ}_k{K}.pkl"
 
-    main(args.graph_pickle, args.pathways, args.output, args.option)
\ No newline at end of file
+    main(args.graph_pickle, args.pathways, args.output, args.option, args.max_evalue)
\ No newline at end of file
@@ -0,0 +1,177 @@
+# workflows/gene_network/scripts/propagate_seeds.py
+#
+# Rank background genes by how strongly they are connected to the seed genes
+# of each pathway, using random walk with restart (personalised PageRank).
+# All pathways are propagated at once as the columns of one restart matrix.
+#
+# Usage: (via main snakefile) or run
+#       python3 propagate_seeds.py --graph-pickle {annotated_graph_object} --restart 0.5 --top-n 100
+#
+
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import pickle
+import argparse
+
+from build_graph import graph_to_sparse
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def seed_matrix(G, nodes):
+    """
+    Build the restart matrix from the 'pathway' node attribute set by
+    annotate_graph().
+
+    Returns
+    -------
+    P : np.ndarray, shape (n_nodes, n_pathways)
+        Column j is the uniform distribution over the seed genes of pathway j.
+    pathways : list[str]
+        Pathway label of every column.
+    """
+    labels = pd.Series([G.nodes[n].get('pathway', 'background') for n in nodes])
+    seeds = labels[labels != 'background'].str.split(',').explode()
+    pathways = sorted(seeds.unique())
+
+    P = np.zeros((len(nodes), len(pathways)))
+    col = pd.Index(pathways).get_indexer(seeds.values)
+    P[seeds.index.values, col] = 1.0
+    P /= P.sum(axis=0, keepdims=True)
+    return P, pathways
+
+def random_walk_with_restart(A, P, restart=0.5, tol=1e-8, max_iter=1000):
+    """
+    Personalised PageRank for many seed sets by sparse power iteration.
+
+    Iterates F <- (1 - restart) * W @ F + restart * P, where W is the
+    column-normalised adjacency, until the largest L1 change of any column
+    drops below `tol`.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix, shape (n, n)
+        Symmetric weighted adjacency (e.g. from graph_to_sparse()).
+    P : np.ndarray, shape (n, m)
+        Restart distributions, one column per seed set.
+    restart : float
+        Probability of jumping back to the seeds at every step.
+
+    Returns
+    -------
+    np.ndarray, shape (n, m) — stationary visiting probabilities.
+    """
+    A = sp.csr_matrix(A, dtype=np.float64)
+    col_sums = np.asarray(A.sum(axis=0)).ravel()
+    inv = np.divide(1.0, col_sums, out=np.zeros_like(col_sums), where=col_sums > 0)
+    W = sp.csr_matrix(A @ sp.diags(inv))
+
+    F = P.copy()
+    for i in range(max_iter):
+        F_next = (1 - restart) * (W @ F) + restart * P
+        delta = np.abs(F_next - F).sum(axis=0).max()
+        F = F_next
+        if delta < tol:
+            print(f"Propagation converged after {i + 1} iterations")
+            break
+    else:
+        print(f"Propagation stopped after {max_iter} iterations without converging (delta={delta:.2e})")
+
+    return F
+
+def rank_candidates(F, P, nodes, pathways, labels, top_n=100):
+    """
+    Turn the propagation scores into a ranked candidate table.
+
+    Seed genes of a pathway are excluded from that pathway's ranking; genes
+    that are seeds of another pathway are kept (their label is reported).
+
+    Returns
+    -------
+    pd.DataFrame with columns: pathway, rank, gene_id, score, annotation
+    """
+    nodes = np.asarray(nodes, dtype=object)
+    labels = np.asarray(labels, dtype=object)
+
+    tables = []
+    for j, pathway in enumerate(pathways):
+        is_seed = P[:, j] > 0
+        score = np.where(is_seed, -np.inf, F[:, j])
+        order = np.argsort(-score, kind='stable')
+        order = order[~is_seed[order]]
+        if top_n:
+            order = order[:top_n]
+        tables.append(pd.DataFrame({
+            'pathway': pathway,
+            'rank': np.arange(1, len(order) + 1),
+            'gene_id': nodes[order],
+            'score': F[order, j],
+            'annotation': labels[order],
+        }))
+
+    return pd.concat(tables, ignore_index=True)
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main(graph_pickle, output_filename, restart, top_n):
+    # load annotated graph
+    with open(graph_pickle, 'rb') as f:
+        G = pickle.load(f)
+    print(f"Loaded graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+    A, nodes = graph_to_sparse(G)
+    P, pathways = seed_matrix(G, nodes)
+    if not pathways:
+        raise ValueError(f"No seed genes annotated in {graph_pickle}; run load_annotate_seed_genes.py first")
+    print(f"Propagating from {int((P > 0).any(axis=1).sum())} seed genes across pathways {pathways}")
+
+    F = random_walk_with_restart(A, P, restart=restart)
+
+    labels = [G.nodes[n].get('pathway', 'background') for n in nodes]
+    ranked = rank_candidates(F, P, nodes, pathways, labels, top_n=top_n)
+
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+    ranked.to_csv(output_filename, sep='\t', index=False)
+    print(f"Ranked candidates saved to: {output_filename}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Rank candidate genes by random walk with restart from the seed genes')
+    parser.add_argument(
+        '--graph-pickle', '-g',
+        type=Path,
+        required=True,
+        help='Path to the annotated graph pickle produced by load_annotate_seed_genes.py'
+    )
+    parser.add_argument(
+        '--restart', '-r',
+        type=float,
+        default=0.5,
+        help='Restart probability of the random walk (0 < r < 1)'
+    )
+    parser.add_argument(
+        '--top-n', '-n',
+        type=int,
+        default=100,
+        help='Number of candidates to report per pathway; use 0 to report every gene'
+    )
+    parser.add_argument(
+        '--output', '-o',
+        type=Path,
+        default=None,
+        help='Output path for the ranked candidate table (.candidates.tsv)'
+    )
+    args = parser.parse_args()
+
+    if not 0 < args.restart < 1:
+        raise ValueError('--restart must be between 0 and 1')
+
+    output = args.output or args.graph_pickle.with_suffix('.candidates.tsv')
+
+    main(args.graph_pickle, output, args.restart, args.top_n)
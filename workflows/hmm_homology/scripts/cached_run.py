@@ -0,0 +1,185 @@
+# workflows/hmm_homology/scripts/cached_run.py
+#
+# Run a shell command through a content-addressed result cache.
+#
+# The cache key is a SHA-256 over
+#   - the step name and the command, with every input, output and key path
+#     replaced by a placeholder (<in0>, <out0>, <db0>, ...), so renaming a
+#     seed or moving the results directory does not change the key,
+#   - the content of every input file,
+#   - the identity of every --key-path (size and mtime of its files, e.g. a
+#     BLAST database directory, which is too large to hash),
+#   - the output of --version-cmd (tool version) and any --key strings.
+# On a hit the cached outputs are copied to the requested output paths and
+# the command is not run. On a miss the command runs and read-only copies of
+# its outputs are stored under the key; entries never share an inode with a
+# workflow output, so editing or rewriting an output cannot alter the cache.
+#
+# Usage (the command is read from stdin and run with bash -euo pipefail):
+#   python3 cached_run.py --cache-dir results/cache --step mafft --version-cmd 'mafft --version' \
+#       --inputs seed_nr-03.faa --outputs seed_nr-04.aln.faa <<'CMD'
+#   mafft --auto seed_nr-03.faa > seed_nr-04.aln.faa
+#   CMD
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def path_signature(path):
+    '''
+    "name size mtime_ns" of a file, or of every file below a directory
+    '''
+    path = Path(path)
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    parts = []
+    for p in files:
+        st = p.stat()
+        parts.append(f"{p.relative_to(path) if path.is_dir() else p.name} {st.st_size} {st.st_mtime_ns}")
+    return '\n'.join(parts)
+
+def tool_version(version_cmd):
+    if not version_cmd:
+        return ''
+    result = subprocess.run(version_cmd, shell=True, capture_output=True, text=True)
+    return (result.stdout + result.stderr).strip()
+
+def normalize_command(command, inputs, outputs, key_paths):
+    '''
+    replace concrete paths in the command by positional placeholders,
+    longest path first so that e.g. x.hmm.h3f is not rewritten through x.hmm
+    '''
+    placeholders = [(str(p), f"<in{i}>") for i, p in enumerate(inputs)]
+    placeholders += [(str(p), f"<out{i}>") for i, p in enumerate(outputs)]
+    placeholders += [(str(p), f"<db{i}>") for i, p in enumerate(key_paths)]
+    for path, placeholder in sorted(placeholders, key=lambda x: len(x[0]), reverse=True):
+        command = command.replace(path, placeholder)
+    return command.strip()
+
+def cache_key(command, inputs, outputs, step='', version='', key_paths=(), keys=()):
+    h = hashlib.sha256()
+    h.update(f"step\0{step}\n".encode())
+    h.update(f"command\0{normalize_command(command, inputs, outputs, key_paths)}\n".encode())
+    h.update(f"version\0{version}\n".encode())
+    for i, p in enumerate(inputs):
+        h.update(f"in{i}\0{file_digest(p)}\n".encode())
+    for i, p in enumerate(key_paths):
+        h.update(f"db{i}\0{path_signature(p)}\n".encode())
+    for key in keys:
+        h.update(f"key\0{key}\n".encode())
+    h.update(f"outputs\0{len(outputs)}\n".encode())
+    return h.hexdigest()
+
+def copy_file(src, dst):
+    '''
+    copy src to a fresh file at dst (an existing dst is replaced, never written
+    through, in case it is a hard link from an older cache version)
+    '''
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    shutil.copyfile(src, dst)
+
+def entry_dir(cache_dir, key):
+    return Path(cache_dir) / key[:2] / key
+
+def restore(entry, outputs):
+    for i, out in enumerate(outputs):
+        copy_file(entry / f"out{i}", out)   # writable copy with a fresh mtime
+
+def store(entry, outputs, meta):
+    '''
+    copy the outputs into a private directory, make them read-only, then
+    rename it into place so concurrent jobs never see a partial entry
+    '''
+    tmp = entry.with_name(f"{entry.name}.tmp-{os.getpid()}")
+    tmp.mkdir(parents=True, exist_ok=True)
+    try:
+        for i, out in enumerate(outputs):
+            copy_file(out, tmp / f"out{i}")
+            os.chmod(tmp / f"out{i}", 0o444)
+        (tmp / 'meta.json').write_text(json.dumps(meta, indent=2) + '\n')
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)   # another job stored the same key first
+
+def cached_run(command, inputs, outputs, cache_dir, step='', version_cmd=None, key_paths=(), keys=()):
+    """
+    Produce `outputs` from the cache entry of this command, or run `command`
+    (bash -euo pipefail) and cache its outputs.
+
+    Returns True on a cache hit. Raises subprocess.CalledProcessError when the
+    command fails; nothing is cached then.
+    """
+    version = tool_version(version_cmd)
+    key = cache_key(command, inputs, outputs, step, version, key_paths, keys)
+    entry = entry_dir(cache_dir, key)
+
+    if (entry / 'meta.json').exists():
+        restore(entry, outputs)
+        return True
+
+    subprocess.run(['bash', '-euo', 'pipefail', '-c', command], check=True)
+    missing = [str(out) for out in outputs if not Path(out).exists()]
+    if missing:
+        raise FileNotFoundError(f"Command finished without writing {', '.join(missing)}")
+    store(entry, outputs, {
+        'step': step,
+        'command': command.strip(),
+        'version': version,
+        'inputs': [str(p) for p in inputs],
+        'outputs': [str(p) for p in outputs],
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+    })
+    return False
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a shell command (read from stdin) through a content-addressed result cache'
+    )
+    parser.add_argument('--cache-dir', required=True, help='Root directory of the cache')
+    parser.add_argument('--step', default='', help='Step name, part of the key (e.g. hmmbuild)')
+    parser.add_argument('--inputs', nargs='*', default=[], help='Input files (hashed by content)')
+    parser.add_argument('--outputs', nargs='+', required=True, help='Output files of the command')
+    parser.add_argument('--key-path', nargs='*', default=[],
+                        help='Files or directories keyed by size and mtime (e.g. BLAST databases)')
+    parser.add_argument('--key', nargs='*', default=[], help='Extra strings for the key (parameters)')
+    parser.add_argument('--version-cmd', default=None, help="Command printing the tool version, e.g. 'mafft --version'")
+    args = parser.parse_args()
+
+    command = sys.stdin.read()
+    if not command.strip():
+        parser.error('no command on stdin')
+
+    try:
+        hit = cached_run(command, args.inputs, args.outputs, args.cache_dir, args.step,
+                         args.version_cmd, args.key_path, args.key)
+    except subprocess.CalledProcessError as e:
+        sys.exit(e.returncode)
+    print(f"[cache] {args.step or 'command'}: {'hit' if hit else 'stored'} ({', '.join(args.outputs)})",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# workflows/hmm_homology/scripts/combined_hmmsearch.py
+#
+# Search all {seed}_{db} profiles against the target proteome in one
+# hmmsearch/hmmscan invocation instead of one hmmsearch per profile.
+#
+#   concat: join every *-05.hmm into one profile database, renaming each
+#           profile (NAME line) to its {seed}_{db} label
+#   demux:  split the combined tblout back into one hmmsearch-style
+#           *-06-results.tbl per profile. hmmscan output is turned around
+#           (target <-> query) and its E-values are rescaled from "per
+#           sequence against N profiles" to hmmsearch's "per profile against
+#           M sequences" (E_search = E_scan * M / N).
+#
+# Usage:
+#   python3 combined_hmmsearch.py concat --profiles results/hmm_homology/*/*-05.hmm \
+#       --output results/hmm_homology/combined/combined-05.hmm
+#   python3 combined_hmmsearch.py demux --tblout results/hmm_homology/combined/combined-06-results.tbl \
+#       --query map00020-K00025_kegg --output results/hmm_homology/map00020-K00025_kegg/map00020-K00025_kegg-06-results.tbl \
+#       [--mode scan --combined-hmm results/hmm_homology/combined/combined-05.hmm --target-fasta {target.faa}]
+
+from pathlib import Path
+import argparse
+
+PROFILE_SUFFIX = '-05.hmm'
+REPORT_EVALUE = 10.0        # hmmsearch default reporting threshold (-E 10)
+
+# tblout columns holding E-values: full sequence, best 1 domain
+EVALUE_FIELDS = (4, 7)
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def profile_label(hmm_path):
+    '''
+    ".../{seed}_{db}/{seed}_{db}-05.hmm" -> "{seed}_{db}"
+    '''
+    name = Path(hmm_path).name
+    return name[:-len(PROFILE_SUFFIX)] if name.endswith(PROFILE_SUFFIX) else Path(hmm_path).stem
+
+def concat_profiles(hmm_files, output):
+    """
+    Concatenate HMMER3 profile files into one database, setting the NAME of
+    every profile to the {seed}_{db} label of its file (hmmbuild names them
+    after the alignment, which is not unique across seeds).
+
+    Returns the list of profile names, in file order.
+    """
+    names = []
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as out:
+        for hmm_file in hmm_files:
+            label = profile_label(hmm_file)
+            with open(hmm_file) as f:
+                for line in f:
+                    if line.startswith('NAME '):
+                        line = f"NAME  {label}\n"
+                        names.append(label)
+                    out.write(line)
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate profile labels in {output}")
+    return names
+
+def count_profiles(hmm_file):
+    with open(hmm_file) as f:
+        return sum(line.startswith('NAME ') for line in f)
+
+def read_descriptions(fasta):
+    '''
+    {sequence id: header description} of the target FASTA; hmmscan reports
+    the profile description, not the protein's
+    '''
+    descriptions = {}
+    with open(fasta) as f:
+        for line in f:
+            if line.startswith('>'):
+                seq_id, _, desc = line[1:].rstrip('\n').partition(' ')
+                descriptions[seq_id] = desc.strip() or '-'
+    return descriptions
+
+def scan_to_search_row(fields, evalue_scale, descriptions):
+    '''
+    one hmmscan tblout row (profile as target) -> hmmsearch layout
+    (protein as target) with rescaled E-values; None when it falls above
+    the hmmsearch reporting threshold
+    '''
+    fields = list(fields)
+    fields[0], fields[1], fields[2], fields[3] = fields[2], fields[3], fields[0], fields[1]
+    for i in EVALUE_FIELDS:
+        fields[i] = float(fields[i]) * evalue_scale
+    if fields[4] > REPORT_EVALUE:
+        return None
+    fields[18] = descriptions.get(fields[0], '-') if descriptions is not None else fields[18]
+    return fields
+
+def demux_tblout(tblout, query, output, mode='search', evalue_scale=1.0, descriptions=None):
+    """
+    Write the hits of profile `query` from a combined tblout as its own
+    hmmsearch tblout.
+
+    Parameters
+    ----------
+    mode : 'search' | 'scan'
+        Whether the combined tblout comes from hmmsearch (profiles are the
+        queries, rows are copied verbatim) or hmmscan (profiles are the
+        targets; rows are turned around, rescaled by `evalue_scale` and
+        sorted by E-value as hmmsearch reports them).
+
+    Returns the number of hits written.
+    """
+    header, footer, rows = [], [], []
+    in_header = True            # column names up to the '#---' ruler; the rest is the trailer
+    query_col = 2 if mode == 'search' else 0
+    with open(tblout) as f:
+        for line in f:
+            if line.startswith('#'):
+                (header if in_header else footer).append(line)
+                if line.startswith('#-'):
+                    in_header = False
+                continue
+            if not line.strip():
+                continue
+            fields = line.rstrip('\n').split(None, 18)
+            if fields[query_col] != query:
+                continue
+            if mode == 'search':
+                rows.append(line)
+            else:
+                fields += ['-'] * (19 - len(fields))
+                row = scan_to_search_row(fields, evalue_scale, descriptions)
+                if row is not None:
+                    rows.append(row)
+
+    if mode == 'scan':
+        rows.sort(key=lambda r: r[4])
+        rows = [
+            ' '.join(f"{v:.2g}" if i in EVALUE_FIELDS else str(v) for i, v in enumerate(r)) + '\n'
+            for r in rows
+        ]
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as out:
+        out.writelines(header)
+        out.writelines(rows)
+        out.writelines(footer)
+    return len(rows)
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Combine profiles for a single hmmsearch/hmmscan run and split its tblout per profile'
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    concat = sub.add_parser('concat', help='Concatenate *-05.hmm profiles into one database')
+    concat.add_argument('--profiles', nargs='+', required=True, help='*-05.hmm files')
+    concat.add_argument('--output', required=True, help='Combined profile database (.hmm)')
+
+    demux = sub.add_parser('demux', help='Extract one profile\'s hits from the combined tblout')
+    demux.add_argument('--tblout', required=True, help='Combined tblout')
+    demux.add_argument('--query', required=True, help='Profile label ({seed}_{db})')
+    demux.add_argument('--output', required=True, help='Per-profile *-06-results.tbl')
+    demux.add_argument('--mode', choices=['search', 'scan'], default='search',
+                       help='Program that produced the combined tblout (default: search)')
+    demux.add_argument('--combined-hmm', default=None,
+                       help='scan mode: combined profile database (number of profiles for the E-value rescaling)')
+    demux.add_argument('--target-fasta', default=None,
+                       help='scan mode: target proteome (number of sequences and their descriptions)')
+    args = parser.parse_args()
+
+    if args.command == 'concat':
+        names = concat_profiles(args.profiles, args.output)
+        print(f"Wrote {len(names)} profile(s) to {args.output}")
+        return
+
+    evalue_scale, descriptions = 1.0, None
+    if args.mode == 'scan':
+        if not (args.combined_hmm and args.target_fasta):
+            parser.error('--mode scan requires --combined-hmm and --target-fasta')
+        descriptions = read_descriptions(args.target_fasta)
+        evalue_scale = len(descriptions) / count_profiles(args.combined_hmm)
+
+    n = demux_tblout(args.tblout, args.query, args.output, args.mode, evalue_scale, descriptions)
+    print(f"Wrote {n} hit(s) of {args.query} to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
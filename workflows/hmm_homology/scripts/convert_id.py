@@ -4,72 +4,189 @@
 # via NCBI gene2accession file.
 #
 # Usage:
-#   python3 convert_id.py -m <hmm_result.tbl> -r <gene2accession> -o <output.txt>
+#   python3 convert_id.py -m <hmm_result.tbl> -r <gene2accession> -o <output.txt> [-i <hit_index.tsv>]
+#   python3 convert_id.py -r <gene2accession> --compile   (only build the memory-mapped lookup)
+#   python3 convert_id.py -r <gene2accession> --batch results/hmm_homology/*/*-06-results.tbl \
+#       [-i <hit_index.tsv>] [--combined <all_hits.tsv>]
+#
+# The protein -> GeneID lookup is compiled once into sorted arrays next to the
+# gene2accession file (<gene2accession>.keys.npy / .values.npy) and
+# memory-mapped by every later run.
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import argparse
+import json
+import os
+
+from hit_index import INDEX_COLS, hits_to_index_rows, source_labels, update_index
+
+# gene2accession path -> (size, mtime_ns, lookup), for in-process callers
+# (Snakemake run: blocks) converting many results with one reference
+_GENE2ACC_CACHE = {}
 
 # ---------------------------------------------------------------------------
 # helpers
 # ---------------------------------------------------------------------------
 
+TBLOUT_COLS = ['protein_accession', 'query_name', 'evalue', 'description']
+
 def parse_hmmsearch_tblout(tblout_path):
     """
     Parse hmmsearch --tblout output file.
     Returns list of protein accessions (target names).
     
     tblout format: first 3 lines are comments (#), last 10 lines are footer.
-    Column 0 is the target (protein) accession.
+    Column 0 is the target (protein) accession, column 2 the query (profile)
+    name, so the tblout of a multi-profile search is parsed as well; select
+    one profile's hits with df[df['query_name'] == name].
+
+    The data lines are split in one vectorised pass: 18 whitespace-separated
+    fields followed by the free-text description (whitespace runs in the
+    description are collapsed to single spaces).
     """
-    rows = []
     with open(tblout_path, 'r') as f:
-        for line in f:
-            if line.startswith('#') or not line.strip():
-                continue
-            cols = line.split()
-            rows.append({
-                'protein_accession': cols[0],
-                'evalue': cols[4],
-                'description': ' '.join(cols[18:])
-            })
-    
-    return pd.DataFrame(rows, columns=['protein_accession', 'evalue', 'description'])
+        lines = [line for line in f if not line.startswith('#') and line.strip()]
+    if not lines:
+        return pd.DataFrame(columns=TBLOUT_COLS)
+
+    fields = pd.Series(lines).str.strip().str.split(n=18, expand=True)
+    description = fields[18] if 18 in fields.columns else pd.Series('', index=fields.index)
+    return pd.DataFrame({
+        'protein_accession': fields[0],
+        'query_name': fields[2],
+        'evalue': fields[4],
+        'description': description.fillna('').str.replace(r'\s+', ' ', regex=True),
+    }, columns=TBLOUT_COLS)
+
+GENE2ACC_COLS = {1: 'GeneID', 5: 'protein_accession'}   # positions in NCBI gene2accession
 
 def load_gene2accession(gene2acc_path):
     """
     Load NCBI gene2accession file and create protein_accession -> GeneID mapping.
     Handles both versioned (XP_123.1) and unversioned (XP_123) accessions.
+
+    Only the GeneID and protein_accession columns are read. Every row
+    contributes its versioned and its version-stripped accession (in that
+    order); when a key occurs more than once the last row wins.
+
+    Returns
+    -------
+    pd.Series of GeneID (int64) indexed by protein accession
     """
-    gene2acc_cols = [
-        'tax_id', 'GeneID', 'status',
-        'RNA_nucleotide_accession', 'RNA_nucleotide_gi',
-        'protein_accession', 'protein_gi',
-        'genomic_nucleotide_accession', 'genomic_nucleotide_gi',
-        'start_position', 'end_position', 'orientation',
-        'assembly', 'mature_peptide_accession', 'mature_peptide_gi', 'Symbol'
-    ]
-    
     print(f"Reading gene2accession file from {gene2acc_path}")
     gene2acc_df = pd.read_csv(
-        gene2acc_path, 
-        sep='\t', 
+        gene2acc_path,
+        sep='\t',
         comment='#',
-        names=gene2acc_cols,
-        low_memory=False
+        header=None,
+        usecols=list(GENE2ACC_COLS),
+        dtype=str,
+    ).rename(columns=GENE2ACC_COLS)
+
+    valid = (
+        gene2acc_df['protein_accession'].notna() & (gene2acc_df['protein_accession'] != '-')
+        & gene2acc_df['GeneID'].notna() & (gene2acc_df['GeneID'] != '-')
     )
-    
-    # Build protein_accession -> GeneID lookup
-    protein_to_gene = {}
-    for _, row in gene2acc_df.iterrows():
-        protein_id = row['protein_accession']
-        gene_id = row['GeneID']
-        if pd.notna(protein_id) and protein_id != '-' and pd.notna(gene_id) and gene_id != '-':
-            protein_to_gene[protein_id] = gene_id
-            # Also store version-stripped key for matching
-            protein_to_gene[protein_id.split('.')[0]] = gene_id
-    
-    return protein_to_gene
+    accessions = gene2acc_df.loc[valid, 'protein_accession'].to_numpy()
+    gene_ids = gene2acc_df.loc[valid, 'GeneID'].to_numpy(dtype=np.int64)
+
+    # interleave versioned / stripped keys so "last wins" follows file order
+    stripped = pd.Series(accessions).str.split('.', n=1).str[0].to_numpy()
+    keys = np.column_stack([accessions, stripped]).ravel()
+    values = np.repeat(gene_ids, 2)
+
+    lookup = pd.Series(values, index=keys)
+    return lookup[~lookup.index.duplicated(keep='last')]
+
+def compiled_paths(gene2acc_path):
+    """
+    Paths of the compiled lookup stored next to the gene2accession file.
+    """
+    base = str(gene2acc_path)
+    return {
+        'keys': Path(f"{base}.keys.npy"),
+        'values': Path(f"{base}.values.npy"),
+        'meta': Path(f"{base}.lookup.json"),
+    }
+
+def source_signature(gene2acc_path):
+    st = os.stat(gene2acc_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def compile_gene2accession(gene2acc_path):
+    """
+    Build the protein accession -> GeneID lookup once and store it as two
+    sorted arrays next to the source file ({file}.keys.npy: fixed-width
+    accession bytes, {file}.values.npy: GeneID). A small JSON records the
+    size/mtime of the source so a re-downloaded gene2accession is recompiled.
+    Files are written under temporary names and renamed into place, so
+    concurrent jobs never map a partial lookup.
+    """
+    lookup = load_gene2accession(gene2acc_path)
+    keys = lookup.index.to_numpy().astype('S')
+    order = np.argsort(keys, kind='stable')
+    arrays = {'keys': keys[order], 'values': lookup.to_numpy()[order]}
+
+    paths = compiled_paths(gene2acc_path)
+    for name, arr in arrays.items():
+        tmp = paths[name].with_name(f"{paths[name].name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            np.save(f, arr)
+        os.replace(tmp, paths[name])
+    tmp = paths['meta'].with_name(f"{paths['meta'].name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(source_signature(gene2acc_path)))
+    os.replace(tmp, paths['meta'])
+    print(f"Compiled {len(keys)} protein-to-gene mappings to {paths['keys']}")
+
+def gene2accession_lookup(gene2acc_path):
+    """
+    Memory-map the compiled lookup of gene2acc_path, compiling it first
+    when it is missing or older than the source file.
+
+    Returns
+    -------
+    (keys, values) : sorted accession bytes and their GeneIDs, both np.memmap
+    """
+    paths = compiled_paths(gene2acc_path)
+    current = (
+        all(p.exists() for p in paths.values())
+        and json.loads(paths['meta'].read_text()) == source_signature(gene2acc_path)
+    )
+    if not current:
+        compile_gene2accession(gene2acc_path)
+    return np.load(paths['keys'], mmap_mode='r'), np.load(paths['values'], mmap_mode='r')
+
+def cached_gene2accession(gene2acc_path):
+    """
+    gene2accession_lookup() memoised for the life of the process;
+    the file is re-checked only if its size or mtime changed.
+    """
+    st = os.stat(gene2acc_path)
+    key = str(Path(gene2acc_path).resolve())
+    cached = _GENE2ACC_CACHE.get(key)
+    if cached is None or cached[:2] != (st.st_size, st.st_mtime_ns):
+        cached = (st.st_size, st.st_mtime_ns, gene2accession_lookup(gene2acc_path))
+        _GENE2ACC_CACHE[key] = cached
+    return cached[2]
+
+def map_accessions(accessions, lookup):
+    """
+    GeneID of every accession by binary search in the compiled lookup;
+    <NA> where the accession is unknown.
+    """
+    keys, values = lookup
+    accessions = pd.Series(accessions, dtype=object).astype(str)
+    query = accessions.to_numpy().astype('S')
+    # accessions longer than the stored key width cannot be in the lookup
+    fits = (accessions.str.len() <= keys.dtype.itemsize).to_numpy()
+    if len(keys) == 0:
+        return pd.Series(pd.NA, index=accessions.index, dtype='Int64')
+    pos = np.clip(np.searchsorted(keys, query), 0, len(keys) - 1)
+    found = fits & (keys[pos] == query)
+    gene_ids = pd.Series(np.asarray(values)[pos], index=accessions.index, dtype='Int64')
+    return gene_ids.where(found, pd.NA)
 
 
 def convert_protein_to_gene_ids(hits_df, protein_to_gene):
@@ -78,9 +195,10 @@ def convert_protein_to_gene_ids(hits_df, protein_to_gene):
     Returns list of gene IDs and list of unmapped accessions.
     Convert dataframe of hits (columns: protein accession, hit evalue, hit description) 
     into a more complete dataframe (namely gene IDs, protein accession, hit evalue, hit description)
+    protein_to_gene is the (keys, values) lookup from gene2accession_lookup().
     """
     # map the protein_accession column
-    hits_df['gene_id'] = hits_df['protein_accession'].map(protein_to_gene)
+    hits_df['gene_id'] = map_accessions(hits_df['protein_accession'], protein_to_gene)
     # reorder columns
     hits_df = hits_df[['protein_accession', 'gene_id', 'evalue', 'description']]
     mapped   = hits_df[hits_df['gene_id'].notna()].copy()
@@ -96,6 +214,114 @@ def save_gene_ids(mapped, output_path):
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     mapped.to_csv(output_path, sep='\t', header=True, index=False)
 
+def convert_hmm_result(hmm_result, reference, output, index=None, protein_to_gene=None):
+    """
+    Convert one hmmsearch tblout to gene IDs and write *output*
+    (*-07-homologous_geneID.txt); optionally record the hits in the
+    consolidated hit index. Pass an already loaded *protein_to_gene*
+    mapping to skip re-reading gene2accession when converting many results
+    in one process. Returns the mapped hits.
+    """
+    # Step 1: Parse hmmsearch results
+    print(f"Parsing hmmsearch results from {hmm_result}")
+    hits_df = parse_hmmsearch_tblout(hmm_result)
+    print(f"Found {len(hits_df)} hmmsearch hit(s)")
+
+    if hits_df.empty:
+        print("No hits found. Creating empty output file.")
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        Path(output).write_text("")
+        if index:
+            # drop stale rows from a previous run of this seed
+            update_index(index, pd.DataFrame(columns=INDEX_COLS), [source_labels(output)[2]])
+        return hits_df
+
+    # Step 2: Load gene2accession mapping (compiled once, then memory-mapped)
+    if protein_to_gene is None:
+        protein_to_gene = gene2accession_lookup(reference)
+        print(f"Loaded {len(protein_to_gene[0])} protein-to-gene mappings")
+
+    # Step 3: Convert protein IDs to gene IDs
+    print("Converting protein IDs to gene IDs")
+    mapped, unmapped = convert_protein_to_gene_ids(hits_df, protein_to_gene)
+
+    print(f"\nConverted {len(mapped)}/{len(hits_df)} protein IDs to gene IDs")
+    if not unmapped.empty:
+        print(f"Unmapped protein IDs: {len(unmapped)}")
+        print(f"Examples of unmapped: {list(unmapped['protein_accession'][:10])}")
+
+    # Step 4: Save output
+    save_gene_ids(mapped, output)
+    print(f"Wrote {len(set(mapped['gene_id']))} unique gene IDs to {output}")
+
+    # Step 5: Record the hits in the consolidated index
+    if index:
+        update_index(index, hits_to_index_rows(mapped, output), [source_labels(output)[2]])
+        print(f"Appended {len(mapped)} hit(s) to {index}")
+
+    return mapped
+
+def hit_output_path(tblout_path):
+    """
+    *-06-results.tbl -> *-07-homologous_geneID.txt in the same directory
+    """
+    tblout_path = Path(tblout_path)
+    return tblout_path.with_name(tblout_path.name.replace('-06-results.tbl', '-07-homologous_geneID.txt'))
+
+def convert_batch(tblouts, reference, index=None, combined=None, protein_to_gene=None):
+    """
+    Convert many hmmsearch results in one process: the gene2accession lookup
+    is opened once, every tblout is written to its *-07-homologous_geneID.txt
+    and the hit index is updated with a single locked write.
+
+    Parameters
+    ----------
+    tblouts : list[Path]
+        *-06-results.tbl files.
+    combined : Path or None
+        Optional cross-seed table of all mapped hits (the *-07 columns plus
+        'source', the {seed}_{db} / {pathway}-{ko} label of the hit).
+
+    Returns
+    -------
+    pd.DataFrame — all mapped hits with their 'source'.
+    """
+    if protein_to_gene is None:
+        protein_to_gene = gene2accession_lookup(reference)
+
+    frames, index_frames, sources = [], [], []
+    for tblout in tblouts:
+        output = hit_output_path(tblout)
+        hits_df = parse_hmmsearch_tblout(tblout)
+        source = source_labels(output)[2]
+        sources.append(source)
+
+        if hits_df.empty:
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            Path(output).write_text("")
+            print(f"{source}: no hits")
+            continue
+
+        mapped, unmapped = convert_protein_to_gene_ids(hits_df, protein_to_gene)
+        save_gene_ids(mapped, output)
+        print(f"{source}: converted {len(mapped)}/{len(hits_df)} protein IDs to gene IDs")
+
+        index_frames.append(hits_to_index_rows(mapped, output))
+        frames.append(mapped.assign(source=source))
+
+    all_hits = pd.concat(frames, ignore_index=True) if frames else \
+        pd.DataFrame(columns=['protein_accession', 'gene_id', 'evalue', 'description', 'source'])
+
+    if index:
+        rows = pd.concat(index_frames, ignore_index=True) if index_frames else pd.DataFrame(columns=INDEX_COLS)
+        update_index(index, rows, sources)
+        print(f"Indexed {len(rows)} hit(s) from {len(sources)} result(s) into {index}")
+    if combined:
+        save_gene_ids(all_hits, combined)
+        print(f"Wrote {len(all_hits)} hit(s) of {len(sources)} result(s) to {combined}")
+
+    return all_hits
+
 # ---------------------------------------------------------------------------
 # main
 # ---------------------------------------------------------------------------
@@ -107,7 +333,7 @@ def main():
     parser.add_argument(
         '-m', '--hmm-result',
         dest='hmm_result',
-        required=True,
+        default=None,
         help='Path to hmmsearch --tblout output file'
     )
     parser.add_argument(
@@ -118,38 +344,43 @@ def main():
     )
     parser.add_argument(
         '-o', '--output',
-        required=True,
+        default=None,
         help='Path to output file for gene IDs'
     )
+    parser.add_argument(
+        '-i', '--index',
+        default=None,
+        help='Optional consolidated hit index (TSV) to append the converted hits to'
+    )
+    parser.add_argument(
+        '--batch',
+        nargs='+',
+        default=None,
+        help='Convert several *-06-results.tbl files in one process; each is written to its *-07-homologous_geneID.txt'
+    )
+    parser.add_argument(
+        '--combined',
+        default=None,
+        help='With --batch: also write all mapped hits, with their source, to this table'
+    )
+    parser.add_argument(
+        '--compile',
+        action='store_true',
+        help='Only (re)build the memory-mapped lookup of the reference and exit'
+    )
     
     args = parser.parse_args()
-    
-    # Step 1: Parse hmmsearch results
-    print(f"Parsing hmmsearch results from {args.hmm_result}")
-    hits_df = parse_hmmsearch_tblout(args.hmm_result)
-    print(f"Found {len(hits_df)} hmmsearch hit(s)")
-    
-    if hits_df.empty:
-        print("No hits found. Creating empty output file.")
-        Path(args.output).write_text("")
+
+    if args.compile:
+        compile_gene2accession(args.reference)
         return
-    
-    # Step 2: Load gene2accession mapping
-    protein_to_gene = load_gene2accession(args.reference)
-    print(f"Loaded {len(protein_to_gene)} protein-to-gene mappings")
-    
-    # Step 3: Convert protein IDs to gene IDs
-    print("Converting protein IDs to gene IDs")
-    mapped, unmapped = convert_protein_to_gene_ids(hits_df, protein_to_gene)
-    
-    print(f"\nConverted {len(mapped)}/{len(hits_df)} protein IDs to gene IDs")
-    if unmapped.empty:
-        print(f"Unmapped protein IDs: {len(unmapped)}")
-        print(f"Examples of unmapped: {unmapped[:10]}")
-    
-    # Step 4: Save output
-    save_gene_ids(mapped, args.output)
-    print(f"Wrote {len(set(mapped['gene_id']))} unique gene IDs to {args.output}")
+    if args.batch:
+        convert_batch(args.batch, args.reference, args.index, args.combined)
+        return
+    if not (args.hmm_result and args.output):
+        parser.error('-m/--hmm-result and -o/--output are required unless --compile or --batch is given')
+
+    convert_hmm_result(args.hmm_result, args.reference, args.output, args.index)
 
 
 if __name__ == '__main__':
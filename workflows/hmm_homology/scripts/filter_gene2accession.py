@@ -0,0 +1,163 @@
+# workflows/hmm_homology/scripts/filter_gene2accession.py
+#
+# Stream NCBI gene2accession.gz and keep the rows of one or more taxa, in a
+# single pass and without writing the (>100 GB) uncompressed file. The
+# archive is decompressed in large blocks; matching rows are picked out of
+# each block with one regex scan anchored on the tax_id column and written
+# to one compact file per taxon.
+#
+# Usage:
+#   python3 filter_gene2accession.py --input data/reference/gene2accession.gz \
+#       --taxon 4558=data/reference/sorghum_gene2accession 3702=data/reference/arabidopsis_gene2accession
+#   wget -q -O - https://ftp.ncbi.nlm.nih.gov/gene/DATA/gene2accession.gz | \
+#       python3 filter_gene2accession.py --input - --taxon 4558=data/reference/sorghum_gene2accession --compile
+
+import argparse
+import gzip
+import os
+import re
+import sys
+from pathlib import Path
+
+BLOCK_SIZE = 64 << 20   # decompressed bytes per block
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def parse_taxa(specs):
+    '''
+    ["4558=path", ...] -> {"4558": Path("path"), ...}
+    '''
+    taxa = {}
+    for spec in specs:
+        taxid, sep, path = spec.partition('=')
+        if not sep or not taxid.isdigit() or not path:
+            raise ValueError(f"--taxon expects TAXID=PATH, got {spec!r}")
+        taxa[taxid] = Path(path)
+    return taxa
+
+def taxon_row_pattern(taxids):
+    '''
+    regex matching a whole gene2accession row whose tax_id (first column) is
+    one of taxids; group 1 is the tax_id
+    '''
+    alternatives = b'|'.join(re.escape(t.encode()) for t in sorted(taxids, key=len, reverse=True))
+    return re.compile(rb'^(' + alternatives + rb')\t[^\n]*\n', re.M)
+
+def iter_blocks(stream, block_size=BLOCK_SIZE):
+    '''
+    yield decompressed blocks that always end on a line boundary
+    '''
+    remainder = b''
+    with gzip.GzipFile(fileobj=stream, mode='rb') as gz:
+        while True:
+            block = gz.read(block_size)
+            if not block:
+                break
+            block = remainder + block
+            cut = block.rfind(b'\n') + 1
+            remainder = block[cut:]
+            if cut:
+                yield block[:cut]
+    if remainder:
+        yield remainder + b'\n'
+
+def filter_gene2accession(stream, taxa, block_size=BLOCK_SIZE):
+    """
+    Copy the rows of every taxon in `taxa` ({tax_id: output path}) from the
+    gzipped gene2accession `stream` to its output file.
+
+    Outputs are written under temporary names and renamed when the whole
+    stream has been read, so an interrupted download never leaves a
+    truncated table behind. Returns {tax_id: rows written}.
+    """
+    pattern = taxon_row_pattern(taxa)
+    single, taxid = None, None
+    if len(taxa) == 1:
+        (taxid,) = taxa
+        single = re.compile(rb'^' + re.escape(taxid.encode()) + rb'\t[^\n]*\n', re.M)
+    tmp_paths = {t: p.with_name(f"{p.name}.{os.getpid()}.tmp") for t, p in taxa.items()}
+    for p in taxa.values():
+        p.parent.mkdir(parents=True, exist_ok=True)
+    handles = {t: open(p, 'wb') for t, p in tmp_paths.items()}
+    counts = dict.fromkeys(taxa, 0)
+
+    try:
+        for n_block, block in enumerate(iter_blocks(stream, block_size), start=1):
+            if single is not None:
+                # one taxon: findall returns the whole rows directly
+                rows = single.findall(block)
+                handles[taxid].writelines(rows)
+                counts[taxid] += len(rows)
+            else:
+                for m in pattern.finditer(block):
+                    taxid = m.group(1).decode()
+                    handles[taxid].write(m.group(0))
+                    counts[taxid] += 1
+            if n_block % 16 == 0:
+                print(f"  {n_block * block_size / 1e9:.1f} GB scanned, "
+                      + ', '.join(f"{t}: {n}" for t, n in counts.items()))
+    except BaseException:
+        for t, h in handles.items():
+            h.close()
+            tmp_paths[t].unlink(missing_ok=True)
+        raise
+
+    for t, h in handles.items():
+        h.close()
+        os.replace(tmp_paths[t], taxa[t])
+    return counts
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract the gene2accession rows of one or more taxa from gene2accession.gz in one streaming pass'
+    )
+    parser.add_argument(
+        '--input',
+        required=True,
+        help="gzipped NCBI gene2accession, or '-' to read it from stdin (e.g. piped from wget)"
+    )
+    parser.add_argument(
+        '--taxon',
+        nargs='+',
+        required=True,
+        help='TAXID=OUTPUT pairs, e.g. 4558=data/reference/sorghum_gene2accession'
+    )
+    parser.add_argument(
+        '--compile',
+        action='store_true',
+        help='Also build the memory-mapped protein -> GeneID lookup of every output (see convert_id.py)'
+    )
+    parser.add_argument(
+        '--block-size',
+        type=int,
+        default=BLOCK_SIZE,
+        help=f'Decompressed bytes processed per block (default: {BLOCK_SIZE})'
+    )
+    args = parser.parse_args()
+
+    taxa = parse_taxa(args.taxon)
+    print(f"Filtering gene2accession for tax_id(s) {', '.join(taxa)}")
+
+    if args.input == '-':
+        counts = filter_gene2accession(sys.stdin.buffer, taxa, args.block_size)
+    else:
+        with open(args.input, 'rb') as stream:
+            counts = filter_gene2accession(stream, taxa, args.block_size)
+
+    for taxid, path in taxa.items():
+        print(f"Wrote {counts[taxid]} rows of tax_id {taxid} to {path}")
+
+    if args.compile:
+        from convert_id import compile_gene2accession
+        for path in taxa.values():
+            compile_gene2accession(path)
+
+
+if __name__ == '__main__':
+    main()
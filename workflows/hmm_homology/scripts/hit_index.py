@@ -0,0 +1,129 @@
+# workflows/hmm_homology/scripts/hit_index.py
+#
+# Maintain one consolidated table of all homology hits
+# (results/hmm_homology/homologous_geneID_index.tsv) so downstream steps can
+# select seed genes with a single query instead of walking every
+# {seed}_{db} / {pathway}-{ko}_kegg directory.
+#
+# convert_id.py appends to the index after writing each *-07-homologous_geneID.txt.
+# To (re)build the index from existing results:
+#   python3 hit_index.py --index results/hmm_homology/homologous_geneID_index.tsv \
+#       --hits results/hmm_homology/*/*-07-homologous_geneID.txt
+
+import argparse
+import fcntl
+from pathlib import Path
+
+import pandas as pd
+
+INDEX_COLS = ['pathway', 'KO', 'gene_id', 'evalue', 'rank', 'source']
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def source_labels(hit_file):
+    """
+    Derive (pathway, KO, source) from the result directory of a hit file.
+
+    "map00020-K00025_kegg" -> ("map00020", "K00025", "map00020-K00025")
+    "{seed}_{db}"          -> ("{seed}_{db}" up to the first '-', "", "{seed}_{db}")
+    """
+    name = Path(hit_file).parent.name
+    source = name.replace('_kegg', '')
+    pathway = name.split('-')[0]
+    ko = source.split('-')[1] if name.endswith('_kegg') and '-' in source else ''
+    return pathway, ko, source
+
+def hits_to_index_rows(hits_df, hit_file):
+    """
+    Convert the hits of one *-07-homologous_geneID.txt into index rows.
+    'rank' is the 1-based position of the hit in the file, which hmmsearch
+    orders by E-value (rank 1 = best hit).
+    """
+    pathway, ko, source = source_labels(hit_file)
+    return pd.DataFrame({
+        'pathway': pathway,
+        'KO': ko,
+        'gene_id': hits_df['gene_id'].astype(str).values,
+        'evalue': hits_df['evalue'].astype(float).values,
+        'rank': range(1, len(hits_df) + 1),
+        'source': source,
+    }, columns=INDEX_COLS)
+
+def read_hit_file(hit_file):
+    '''
+    read one *-07-homologous_geneID.txt; convert_id.py writes an empty file when
+    hmmsearch found nothing
+    '''
+    if Path(hit_file).stat().st_size == 0:
+        return pd.DataFrame(columns=['gene_id', 'evalue'])
+    return pd.read_csv(hit_file, sep='\t', dtype={'gene_id': str})
+
+def update_index(index_path, rows, sources):
+    """
+    Add `rows` to the index, replacing any rows previously recorded for
+    `sources` (re-runs of the same seed). A new source is a plain append;
+    the file is only rewritten when a source is replaced. Concurrent
+    Snakemake jobs are serialised with an exclusive lock on the index.
+    """
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(index_path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            has_header = bool(f.readline())
+            existing = None
+            if has_header:
+                f.seek(0)
+                existing = pd.read_csv(f, sep='\t', dtype={'gene_id': str, 'KO': str}, keep_default_na=False)
+
+            if existing is not None and existing['source'].isin(sources).any():
+                merged = pd.concat([existing[~existing['source'].isin(sources)], rows], ignore_index=True)
+                f.seek(0)
+                f.truncate()
+                merged.to_csv(f, sep='\t', index=False)
+            else:
+                f.seek(0, 2)
+                rows.to_csv(f, sep='\t', index=False, header=not has_header)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def index_hit_files(index_path, hit_files):
+    '''
+    (re)index a batch of *-07-homologous_geneID.txt files in one update
+    '''
+    frames = [hits_to_index_rows(read_hit_file(f), f) for f in hit_files]
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=INDEX_COLS)
+    update_index(index_path, rows, [source_labels(f)[2] for f in hit_files])
+    return rows
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Add *-07-homologous_geneID.txt files to the consolidated homology hit index'
+    )
+    parser.add_argument(
+        '-i', '--index',
+        required=True,
+        help='Path to the consolidated hit index (TSV)'
+    )
+    parser.add_argument(
+        '--hits',
+        nargs='+',
+        required=True,
+        help='One or more *-07-homologous_geneID.txt files'
+    )
+    args = parser.parse_args()
+
+    rows = index_hit_files(args.index, args.hits)
+    print(f"Indexed {len(rows)} hit(s) from {len(args.hits)} file(s) into {args.index}")
+
+
+if __name__ == '__main__':
+    main()
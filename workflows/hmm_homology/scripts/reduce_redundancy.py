@@ -0,0 +1,204 @@
+# workflows/hmm_homology/scripts/reduce_redundancy.py
+#
+# Cluster the BLAST-derived homologs of one seed (*-03.faa) before MAFFT and
+# keep one representative per cluster of near-identical sequences.
+#
+# Sequences are compared through MinHash sketches of their amino acid k-mer
+# sets: every sequence is reduced to the minimum of N hash functions over
+# its k-mers (all k-mers x all hashes in one numpy operation), and the fraction of equal sketch
+# entries estimates the k-mer Jaccard index J. J is turned into an identity
+# estimate with the Mash formula 1 + ln(2J / (1 + J)) / k. Clustering is
+# greedy like CD-HIT: longest sequence first, each joins the most similar
+# representative above the identity threshold or becomes a representative.
+#
+# Outputs next to the input:
+#   {seed}_{db}-03.nr.faa        representatives (input order)
+#   {seed}_{db}-03.clusters.tsv  representative, member, estimated identity
+#
+# Usage:
+#   python3 reduce_redundancy.py --input results/hmm_homology/seed_nr/seed_nr-03.faa \
+#       --identity 0.9 [--max-seqs 200] [--kmer 5] [--sketch-size 128]
+
+from pathlib import Path
+import argparse
+import numpy as np
+
+KMER            = 5
+SKETCH_SIZE     = 128
+SEED            = 67        # hash functions are fixed so reruns give the same clusters
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def output_paths(faa):
+    '''
+    "{x}-03.faa" -> ("{x}-03.nr.faa", "{x}-03.clusters.tsv")
+    '''
+    faa = Path(faa)
+    stem = faa.name[:-len('.faa')] if faa.name.endswith('.faa') else faa.name
+    return faa.with_name(f"{stem}.nr.faa"), faa.with_name(f"{stem}.clusters.tsv")
+
+def read_fasta(faa):
+    '''
+    list of (id, header line, sequence)
+    '''
+    records, header, chunks = [], None, []
+    with open(faa) as f:
+        for line in f:
+            if line.startswith('>'):
+                if header is not None:
+                    records.append((header[1:].split()[0], header, ''.join(chunks)))
+                header, chunks = line.rstrip('\n'), []
+            elif header is not None:
+                chunks.append(line.strip())
+    if header is not None:
+        records.append((header[1:].split()[0], header, ''.join(chunks)))
+    return records
+
+def hash_parameters(sketch_size, seed=SEED):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=sketch_size, dtype=np.uint64) | np.uint64(1)  # odd multipliers
+    b = rng.integers(0, 2**63, size=sketch_size, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+def kmer_codes(sequence, k):
+    '''
+    every k-mer of `sequence` packed into one integer (7 bits per residue)
+    '''
+    residues = np.frombuffer(sequence.upper().encode('ascii'), dtype=np.uint8).astype(np.uint64)
+    if residues.size < k:
+        k = max(residues.size, 1)
+        residues = residues if residues.size else np.zeros(1, dtype=np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(residues, k)
+    shifts = np.arange(k - 1, -1, -1, dtype=np.uint64) * np.uint64(7)
+    return np.unique((windows << shifts).sum(axis=1, dtype=np.uint64))
+
+def minhash_sketches(sequences, k=KMER, sketch_size=SKETCH_SIZE):
+    """
+    (n_sequences, sketch_size) matrix of MinHash values; column j is the
+    minimum of multiply-shift hash j over the k-mers of each sequence.
+    """
+    a, b = hash_parameters(sketch_size)
+    sketches = np.empty((len(sequences), sketch_size), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for i, sequence in enumerate(sequences):
+            hashes = kmer_codes(sequence, k)[None, :] * a + b
+            hashes ^= hashes >> np.uint64(29)
+            sketches[i] = hashes.min(axis=1)
+    return sketches
+
+def jaccard_to_identity(jaccard, k=KMER):
+    '''
+    Mash distance estimate: identity = 1 + ln(2J / (1 + J)) / k (0 for J = 0)
+    '''
+    jaccard = np.asarray(jaccard, dtype=float)
+    with np.errstate(divide='ignore'):
+        identity = 1 + np.log(2 * jaccard / (1 + jaccard)) / k
+    return np.clip(np.nan_to_num(identity, neginf=0.0), 0.0, 1.0)
+
+def cluster_sequences(sequences, identity=0.9, max_seqs=0, k=KMER, sketch_size=SKETCH_SIZE):
+    """
+    Greedy clustering of `sequences` at estimated `identity`.
+
+    Sequences are visited longest first; each joins its most similar
+    representative at or above `identity`, otherwise it becomes a new
+    representative. With `max_seqs` > 0 only that many representatives are
+    kept (largest clusters first) and the members of the dropped clusters
+    are moved to their most similar kept representative.
+
+    Returns (representative index per sequence, estimated identity to it).
+    """
+    n = len(sequences)
+    sketches = minhash_sketches(sequences, k, sketch_size)
+    order = sorted(range(n), key=lambda i: len(sequences[i]), reverse=True)
+
+    rep_of = np.empty(n, dtype=np.int64)
+    ident = np.ones(n)
+    reps = []
+    rep_sketches = np.empty((n, sketch_size), dtype=np.uint64)
+    for i in order:
+        if reps:
+            jaccard = (rep_sketches[:len(reps)] == sketches[i]).mean(axis=1)
+            scores = jaccard_to_identity(jaccard, k)
+            best = int(scores.argmax())
+            if scores[best] >= identity:
+                rep_of[i], ident[i] = reps[best], scores[best]
+                continue
+        rep_sketches[len(reps)] = sketches[i]
+        reps.append(i)
+        rep_of[i] = i
+
+    if max_seqs and len(reps) > max_seqs:
+        sizes = np.bincount(rep_of, minlength=n)
+        kept = sorted(reps, key=lambda r: (-sizes[r], -len(sequences[r])))[:max_seqs]
+        kept_sketches = sketches[kept]
+        for i in np.flatnonzero(~np.isin(rep_of, kept)):
+            scores = jaccard_to_identity((kept_sketches == sketches[i]).mean(axis=1), k)
+            best = int(scores.argmax())
+            rep_of[i], ident[i] = kept[best], scores[best]
+
+    return rep_of, ident
+
+def reduce_redundancy(faa, identity=0.9, max_seqs=0, k=KMER, sketch_size=SKETCH_SIZE,
+                      nr_faa=None, clusters_tsv=None):
+    """
+    Write the representatives of `faa` and the representative-to-member
+    table (default paths: output_paths). Returns (n_sequences, n_representatives).
+    """
+    default_nr, default_clusters = output_paths(faa)
+    nr_faa = Path(nr_faa or default_nr)
+    clusters_tsv = Path(clusters_tsv or default_clusters)
+    records = read_fasta(faa)
+
+    if records:
+        rep_of, ident = cluster_sequences([seq for _, _, seq in records], identity, max_seqs, k, sketch_size)
+    else:
+        rep_of, ident = np.empty(0, dtype=np.int64), np.empty(0)
+    is_rep = rep_of == np.arange(len(records))
+
+    with open(nr_faa, 'w') as out:
+        for (_, header, seq), keep in zip(records, is_rep):
+            if keep:
+                out.write(f"{header}\n")
+                out.writelines(seq[j:j + 60] + '\n' for j in range(0, len(seq), 60))
+
+    with open(clusters_tsv, 'w') as out:
+        out.write('representative\tmember\testimated_identity\n')
+        for j in sorted(range(len(records)), key=lambda j: (rep_of[j], j != rep_of[j], j)):
+            out.write(f"{records[rep_of[j]][0]}\t{records[j][0]}\t{ident[j]:.3f}\n")
+
+    return len(records), int(is_rep.sum())
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Reduce a homolog FASTA to cluster representatives (MinHash k-mer sketches) before alignment'
+    )
+    parser.add_argument('--input', required=True, help='Homolog FASTA (*-03.faa)')
+    parser.add_argument('--identity', type=float, default=0.9,
+                        help='Estimated identity at which a sequence joins a cluster (default: 0.9)')
+    parser.add_argument('--max-seqs', type=int, default=0,
+                        help='Keep at most this many representatives, largest clusters first (default: 0, no cap)')
+    parser.add_argument('--kmer', type=int, default=KMER, help=f'k-mer length (default: {KMER})')
+    parser.add_argument('--sketch-size', type=int, default=SKETCH_SIZE,
+                        help=f'Hash functions per sketch (default: {SKETCH_SIZE})')
+    parser.add_argument('--output', default=None, help='Representative FASTA (default: *-03.nr.faa)')
+    parser.add_argument('--clusters', default=None, help='Cluster table (default: *-03.clusters.tsv)')
+    args = parser.parse_args()
+
+    if not 0 < args.identity <= 1:
+        parser.error('--identity must be in (0, 1]')
+    if not 1 <= args.kmer <= 9:
+        parser.error('--kmer must be between 1 and 9')   # 7 bits per residue in a 64-bit code
+
+    n, n_reps = reduce_redundancy(args.input, args.identity, args.max_seqs, args.kmer,
+                                  args.sketch_size, args.output, args.clusters)
+    print(f"Kept {n_reps}/{n} sequences of {args.input} as cluster representatives")
+
+
+if __name__ == '__main__':
+    main()
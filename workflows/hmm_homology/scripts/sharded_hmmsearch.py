@@ -0,0 +1,149 @@
+# workflows/hmm_homology/scripts/sharded_hmmsearch.py
+#
+# Run one profile's hmmsearch as N parallel jobs over slices of the target
+# proteome.
+#
+#   split: distribute the target sequences over N shard FASTAs with about the
+#          same number of residues each (hmmsearch time is linear in
+#          residues), and record the total number of sequences. Every shard
+#          is searched with -Z <total>, so its E-values are those of a search
+#          against the whole proteome.
+#   merge: join the shard tblouts into one *-06-results.tbl, ordered by
+#          E-value like a single hmmsearch.
+#
+# Usage:
+#   python3 sharded_hmmsearch.py split --target data/target.faa --shards 8 \
+#       --output-dir results/hmm_homology/target_shards
+#   hmmsearch --max -Z $(cat results/hmm_homology/target_shards/n_sequences.txt) --tblout shard-000.tbl seed-05.hmm shard-000.faa
+#   python3 sharded_hmmsearch.py merge --tblouts shard-*.tbl --output seed-06-results.tbl
+
+from pathlib import Path
+import argparse
+import heapq
+
+N_SEQUENCES_FILE = 'n_sequences.txt'
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def shard_paths(output_dir, n_shards):
+    return [Path(output_dir) / f"shard-{i:03d}.faa" for i in range(n_shards)]
+
+def read_fasta_records(fasta):
+    '''
+    yield (record text, residue count) for every record of a FASTA file
+    '''
+    lines, residues = [], 0
+    with open(fasta) as f:
+        for line in f:
+            if line.startswith('>'):
+                if lines:
+                    yield ''.join(lines), residues
+                lines, residues = [line], 0
+            elif lines:
+                lines.append(line)
+                residues += len(line.strip())
+    if lines:
+        yield ''.join(lines), residues
+
+def split_fasta(target, output_dir, n_shards):
+    """
+    Write the records of `target` to `n_shards` FASTA files with balanced
+    residue counts: longest sequence first, each to the currently lightest
+    shard. Records keep their input order within a shard.
+
+    Returns the total number of sequences (the -Z of every shard search),
+    which is also written to `output_dir`/n_sequences.txt.
+    """
+    records = list(read_fasta_records(target))
+    if len(records) < n_shards:
+        raise ValueError(f"{target} has {len(records)} sequences, fewer than {n_shards} shards")
+    order = sorted(range(len(records)), key=lambda i: records[i][1], reverse=True)
+    heap = [(0, shard) for shard in range(n_shards)]
+    assignment = [0] * len(records)
+    for i in order:
+        load, shard = heapq.heappop(heap)
+        assignment[i] = shard
+        heapq.heappush(heap, (load + records[i][1], shard))
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    handles = [open(p, 'w') for p in shard_paths(output_dir, n_shards)]
+    try:
+        for (text, _), shard in zip(records, assignment):
+            handles[shard].write(text)
+    finally:
+        for h in handles:
+            h.close()
+
+    (output_dir / N_SEQUENCES_FILE).write_text(f"{len(records)}\n")
+    loads = sorted(load for load, _ in heap)
+    print(f"Split {len(records)} sequences into {n_shards} shard(s), "
+          f"{loads[0]}-{loads[-1]} residues each")
+    return len(records)
+
+def merge_tblouts(tblouts, output):
+    """
+    Concatenate the hits of hmmsearch tblouts of the same profile against
+    different shards, sorted by full-sequence E-value (ties: higher score
+    first). The comment header and footer of the first tblout are kept.
+
+    Returns the number of hits written.
+    """
+    header, footer, rows = [], [], []
+    for n, tblout in enumerate(tblouts):
+        in_header = True        # column names up to the '#---' ruler; the rest is the trailer
+        with open(tblout) as f:
+            for line in f:
+                if line.startswith('#'):
+                    if n == 0:
+                        (header if in_header else footer).append(line)
+                    if line.startswith('#-'):
+                        in_header = False
+                    continue
+                if not line.strip():
+                    continue
+                fields = line.split(None, 6)
+                rows.append((float(fields[4]), -float(fields[5]), line))
+    rows.sort(key=lambda r: r[:2])
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as out:
+        out.writelines(header)
+        out.writelines(line for _, _, line in rows)
+        out.writelines(footer)
+    return len(rows)
+
+# ---------------------------------------------------------------------------
+# main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Split the target proteome into residue-balanced shards and merge the per-shard hmmsearch tblouts'
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    split = sub.add_parser('split', help='Split the target FASTA into balanced shards')
+    split.add_argument('--target', required=True, help='Target proteome FASTA')
+    split.add_argument('--shards', type=int, required=True, help='Number of shards')
+    split.add_argument('--output-dir', required=True, help='Directory of shard-NNN.faa and n_sequences.txt')
+
+    merge = sub.add_parser('merge', help='Merge the shard tblouts of one profile')
+    merge.add_argument('--tblouts', nargs='+', required=True, help='Per-shard hmmsearch tblouts')
+    merge.add_argument('--output', required=True, help='Merged *-06-results.tbl')
+    args = parser.parse_args()
+
+    if args.command == 'split':
+        if args.shards < 1:
+            parser.error('--shards must be at least 1')
+        split_fasta(args.target, args.output_dir, args.shards)
+    else:
+        n = merge_tblouts(args.tblouts, args.output)
+        print(f"Merged {n} hit(s) from {len(args.tblouts)} shard(s) into {args.output}")
+
+
+if __name__ == '__main__':
+    main()
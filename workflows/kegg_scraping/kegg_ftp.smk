@@ -7,6 +7,7 @@ Download & prepare the following from KEGG FTP:
     ko.tar.gz (EC to KO mapping)
     KEGG_SP (KO to organism mapping)
     map (pathway to KO list)
+and compile the organism files into one indexed SQLite database (kegg.sqlite)
 """
 
 # configfile: "/Users/daffaaprilio/Documents/Work/jspp67_bioinf/configs/config-kegg_ftp.yaml"
@@ -20,12 +21,14 @@ KEGG_SP_BASE_URL    = config['url_kegg_sp_base']
 MAP_URL             = config['url_pathway']
 
 ORGANISMS = config['organisms']
+KEGG_DB   = f"{WDIR}/{config.get('reference_kegg_db', 'data/reference/KEGG/kegg.sqlite')}"
 
 rule all:
     input:
         f'{WDIR}/data/reference/KEGG/ko.tar.gz',
         expand(f'{WDIR}/data/reference/KEGG/{{organism}}', organism=ORGANISMS),
-        f'{WDIR}/data/reference/KEGG/map.tar.gz'
+        f'{WDIR}/data/reference/KEGG/map.tar.gz',
+        KEGG_DB
 
 rule obtain_ko:
     params:
@@ -68,3 +71,18 @@ rule obtain_map:
         """
         wget --user {params.user} --password {params.password} -O {output.archive} {params.url}
         """
+
+rule build_kegg_db:
+    """Compile the mirrored organism lists and .pep files into kegg.sqlite (reads .gz directly)."""
+    input:
+        org_dirs    = expand(f'{WDIR}/data/reference/KEGG/{{organism}}', organism=ORGANISMS),
+        script      = f'{WDIR}/workflows/kegg_scraping/scripts/kegg_db.py'
+    params:
+        kegg_dir    = f'{WDIR}/data/reference/KEGG',
+        organisms   = " ".join(ORGANISMS)
+    output:
+        KEGG_DB
+    shell:
+        """
+        python {input.script} --kegg-dir {params.kegg_dir} --species {params.organisms} --output {output}
+        """
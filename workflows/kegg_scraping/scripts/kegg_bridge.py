@@ -0,0 +1,123 @@
+# workflows/kegg_scraping/scripts/kegg_bridge.py
+#
+# Importable API of the KEGG -> HMM homology bridge, so Snakemake `run:`
+# blocks (or one driver process) can split pathway files by KO, write the
+# sp:geneid lists, extract sequences and convert hmmsearch hits without
+# starting a Python interpreter (and importing pandas) per KO. The per-step
+# scripts stay available as thin command-line wrappers around the same
+# functions.
+#
+# In a Snakefile:
+#   sys.path.insert(0, f"{WDIR}/workflows/kegg_scraping/scripts")
+#   import kegg_bridge
+#
+# As a driver (everything up to the *-03.faa files, in one process):
+#   python kegg_bridge.py --pathway-files results/kegg/sbi_map00020_genes.tsv \
+#       --ko-dir results/by_ko --results-dir results/hmm_homology --kegg-dir data/reference/KEGG
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "hmm_homology" / "scripts"))
+
+from separate_pathway_gene_files import split_by_ko
+from obtain_spgeneid import write_spgeneids
+from obtain_aa_sequences import extract_sequences, extract_sequences_batch
+from convert_id import cached_gene2accession, convert_batch, convert_hmm_result
+
+__all__ = [
+    "split_by_ko",
+    "write_spgeneids",
+    "extract_sequences",
+    "extract_sequences_batch",
+    "cached_gene2accession",
+    "convert_ids",
+    "convert_ids_batch",
+    "prepare_sequences",
+]
+
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def convert_ids(hmm_result, reference, output, index=None):
+    """
+    convert_id.py for one hmmsearch result, reusing the gene2accession
+    mapping already loaded in this process. Returns the mapped hits.
+    """
+    return convert_hmm_result(hmm_result, reference, output, index,
+                              protein_to_gene=cached_gene2accession(reference))
+
+
+def convert_ids_batch(hmm_results, reference, index=None, combined=None):
+    """
+    convert_id.py --batch: every *-06-results.tbl to its *-07 file with one
+    lookup and one hit-index update; optionally a combined table of all
+    hits. Returns the combined hits.
+    """
+    return convert_batch(hmm_results, reference, index, combined,
+                         protein_to_gene=cached_gene2accession(reference))
+
+
+def prepare_sequences(pathway_files, ko_dir, results_dir, kegg_dir=None, kegg_db=None):
+    """
+    Run the bridge up to the HMM homology module for every pathway gene
+    file: split by KO, write each *-02-spgeneid.txt and extract every
+    *-03.faa (in one pass over each .pep unless *kegg_db* is given).
+
+    Parameters
+    ----------
+    pathway_files : dict[str, Path]
+        Reference pathway id -> pathway gene TSV from kegg_pathway_genes.py.
+    ko_dir, results_dir : Path
+        results_ko_dir and results_homology_dir of the config.
+
+    Returns
+    -------
+    list[Path] — the written *-03.faa files.
+    """
+    pairs = []
+    for pathway, pathway_file in pathway_files.items():
+        for seed in split_by_ko(pathway_file, pathway, ko_dir):
+            seed_dir = Path(ko_dir) / f"{seed}_kegg"
+            spgeneid = seed_dir / f"{seed}_kegg-02-spgeneid.txt"
+            write_spgeneids(seed_dir / f"{seed}_kegg-01-pathway_genes_from_KEGG.txt", spgeneid, kegg_db)
+            pairs.append((spgeneid, Path(results_dir) / f"{seed}_kegg" / f"{seed}_kegg-03.faa"))
+
+    found, total = extract_sequences_batch(pairs, kegg_dir, kegg_db)
+    print(f"Wrote {found}/{total} sequences for {len(pairs)} KO(s)")
+    return [faa for _, faa in pairs]
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the KEGG bridge (split by KO, sp:geneid lists, sequences) in one process."
+    )
+    parser.add_argument(
+        "--pathway-files",
+        required=True,
+        nargs="+",
+        help="Pathway gene TSVs from kegg_pathway_genes.py ({species}_{pathway}_genes.tsv)",
+    )
+    parser.add_argument("--ko-dir",      required=True, help="Output directory of the per-KO files (results_ko_dir)")
+    parser.add_argument("--results-dir", required=True, help="HMM homology results directory (results_homology_dir)")
+    parser.add_argument("--kegg-dir",    help="Root of the local KEGG FTP mirror")
+    parser.add_argument("--kegg-db",     help="Compiled KEGG database (kegg_db.py)")
+    args = parser.parse_args()
+
+    if not (args.kegg_dir or args.kegg_db):
+        parser.error("one of --kegg-dir or --kegg-db is required")
+
+    # {species}_{pathway}_genes.tsv -> pathway
+    pathway_files = {Path(f).stem.rsplit("_", 2)[-2]: f for f in args.pathway_files}
+    prepare_sequences(pathway_files, args.ko_dir, args.results_dir, args.kegg_dir, args.kegg_db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# workflows/kegg_scraping/scripts/kegg_db.py
+#
+# Compile the local KEGG FTP mirror into one indexed SQLite database
+# (pathway -> gene, gene -> KO / NCBI GeneID / NCBI protein, gene -> .pep
+# record offset) so the KEGG scripts run indexed lookups instead of
+# re-reading the flat .list and .pep files.
+#
+# Usage:
+#   python kegg_db.py --kegg-dir data/reference/KEGG --output data/reference/KEGG/kegg.sqlite
+#   python kegg_db.py --kegg-dir data/reference/KEGG --output data/reference/KEGG/kegg.sqlite --species sbi zma
+
+import argparse
+import gzip
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+from kegg_pathway_genes import parse_kegg_list
+from obtain_aa_sequences import scan_pep_records
+
+WDIR = Path(__file__).resolve().parents[3]
+
+# table name -> (list file suffix, value column)
+LIST_TABLES = {
+    "pathway_gene":        ("pathway.list",        "pathway"),
+    "gene_ko":             ("ko.list",             "ko"),
+    "gene_ncbi_geneid":    ("ncbi-geneid.list",    "ncbi_geneid"),
+    "gene_ncbi_proteinid": ("ncbi-proteinid.list", "ncbi_proteinid"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pathway_gene        (species TEXT, gene TEXT, pathway TEXT);
+CREATE TABLE IF NOT EXISTS gene_ko             (species TEXT, gene TEXT, ko TEXT);
+CREATE TABLE IF NOT EXISTS gene_ncbi_geneid    (species TEXT, gene TEXT, ncbi_geneid TEXT);
+CREATE TABLE IF NOT EXISTS gene_ncbi_proteinid (species TEXT, gene TEXT, ncbi_proteinid TEXT);
+CREATE TABLE IF NOT EXISTS pep_record          (spgeneid TEXT PRIMARY KEY, species TEXT, pep_file TEXT,
+                                                offset INTEGER, length INTEGER);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_pathway_gene_pathway  ON pathway_gene (species, pathway);
+CREATE INDEX IF NOT EXISTS idx_gene_ko_gene          ON gene_ko (species, gene);
+CREATE INDEX IF NOT EXISTS idx_gene_ko_ko            ON gene_ko (ko);
+CREATE INDEX IF NOT EXISTS idx_gene_geneid_gene      ON gene_ncbi_geneid (species, gene);
+CREATE INDEX IF NOT EXISTS idx_gene_proteinid_gene   ON gene_ncbi_proteinid (species, gene);
+CREATE INDEX IF NOT EXISTS idx_pep_record_species   ON pep_record (species);
+"""
+
+
+# ---------------------------------------------------------------------------
+# helpers
+# ---------------------------------------------------------------------------
+
+def find_file(org_dir, name):
+    """Return org_dir/name, or its .gz counterpart if only that exists."""
+    for path in (org_dir / name, org_dir / f"{name}.gz"):
+        if path.exists():
+            return path
+    return None
+
+
+def unpack_pep(pep_gz):
+    """
+    Decompress a mirrored .pep.gz next to itself; record offsets are only
+    meaningful in the plain file, which the sequence lookups then seek into.
+    """
+    pep_file = pep_gz.with_suffix("")
+    with gzip.open(pep_gz, "rb") as src, open(pep_file, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    return pep_file
+
+
+def load_species(conn, kegg_dir, sp):
+    """Replace all rows of one species with the content of its mirror directory."""
+    org_dir = kegg_dir / sp
+    for table in list(LIST_TABLES) + ["pep_record"]:
+        conn.execute(f"DELETE FROM {table} WHERE species = ?", (sp,))
+
+    for table, (suffix, value_col) in LIST_TABLES.items():
+        path = find_file(org_dir, f"{sp}_{suffix}")
+        if path is None:
+            print(f"WARNING: {sp}_{suffix} not found in {org_dir}, skipping")
+            continue
+        df = parse_kegg_list(path, ("gene", "value"))
+        conn.executemany(
+            f"INSERT INTO {table} (species, gene, {value_col}) VALUES (?, ?, ?)",
+            zip([sp] * len(df), df["gene"], df["value"]),
+        )
+        print(f"  {sp}: {len(df):,} rows → {table}")
+
+    pep_files = sorted(org_dir.glob("*.pep")) or [unpack_pep(f) for f in sorted(org_dir.glob("*.pep.gz"))]
+    if not pep_files:
+        print(f"WARNING: no .pep file found in {org_dir}, sequences not indexed")
+        return
+    pep_file = pep_files[0]     # each species has exactly one .pep
+    pep_path = str(pep_file.resolve())
+    conn.executemany(
+        "INSERT OR IGNORE INTO pep_record VALUES (?, ?, ?, ?, ?)",
+        ((record_id, sp, pep_path, offset, length)
+         for record_id, offset, length in scan_pep_records(pep_file)),
+    )
+    n = conn.execute("SELECT COUNT(*) FROM pep_record WHERE species = ?", (sp,)).fetchone()[0]
+    print(f"  {sp}: {n:,} sequences indexed from {pep_file.name}")
+
+
+def build_kegg_db(kegg_dir, db_path, species=None):
+    """
+    Build (or update, for the given species) the SQLite database at db_path.
+
+    Parameters
+    ----------
+    kegg_dir : Path
+        Root of the local KEGG FTP mirror (one sub-directory per organism).
+    db_path : Path
+        Output database.
+    species : list[str] or None
+        Organism codes to (re)load; default: every sub-directory holding a
+        ``{sp}_pathway.list`` (or ``.gz``).
+    """
+    if species is None:
+        species = sorted(
+            d.name for d in kegg_dir.iterdir()
+            if d.is_dir() and find_file(d, f"{d.name}_pathway.list")
+        )
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(SCHEMA)
+        for sp in species:
+            print(f"Loading species {sp} ...")
+            load_species(conn, kegg_dir, sp)
+        conn.executescript(INDEXES)
+        conn.execute("ANALYZE")
+    print(f"KEGG database written to {db_path} ({len(species)} species)")
+
+
+# ---------------------------------------------------------------------------
+# queries
+# ---------------------------------------------------------------------------
+
+def query_species_pathway_genes(db_path, pathways, species):
+    """
+    Database equivalent of kegg_pathway_genes.get_species_pathway_genes:
+    genes of *species* in any of *pathways* (reference ``map`` ids) joined
+    with their NCBI GeneID, KO and NCBI protein annotations, in the same
+    row order as the flat-file merges.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns: pathway, gene, ncbi_geneid, ko, ncbi_proteinid
+    """
+    pathway_ids = {pathway.replace("map", species): pathway for pathway in pathways}
+    placeholders = ",".join("?" * len(pathway_ids))
+    query = f"""
+        SELECT pg.pathway, pg.gene, g.ncbi_geneid, k.ko, p.ncbi_proteinid
+        FROM pathway_gene pg
+        LEFT JOIN gene_ncbi_geneid    g ON g.species = pg.species AND g.gene = pg.gene
+        LEFT JOIN gene_ko             k ON k.species = pg.species AND k.gene = pg.gene
+        LEFT JOIN gene_ncbi_proteinid p ON p.species = pg.species AND p.gene = pg.gene
+        WHERE pg.species = ? AND pg.pathway IN ({placeholders})
+        ORDER BY pg.rowid, g.rowid, k.rowid, p.rowid
+    """
+    with sqlite3.connect(db_path) as conn:
+        genes = pd.read_sql_query(query, conn, params=[species, *pathway_ids])
+    genes["pathway"] = genes["pathway"].map(pathway_ids)
+    return genes
+
+
+def query_pep_records(db_path, spgeneids):
+    """
+    Look up the .pep location of every sp:geneid.
+
+    Returns
+    -------
+    pd.DataFrame
+        Columns: spgeneid, species, pep_file, offset, length
+        (IDs without a sequence are absent).
+    """
+    spgeneids = list(spgeneids)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TEMP TABLE wanted (spgeneid TEXT PRIMARY KEY)")
+        conn.executemany("INSERT OR IGNORE INTO wanted VALUES (?)", ((i,) for i in spgeneids))
+        return pd.read_sql_query(
+            "SELECT r.* FROM wanted w JOIN pep_record r ON r.spgeneid = w.spgeneid",
+            conn,
+        )
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the local KEGG FTP mirror into an indexed SQLite database."
+    )
+    parser.add_argument(
+        "--kegg-dir",
+        default=str(WDIR / "data/reference/KEGG"),
+        help="Root of the local KEGG FTP mirror (default: data/reference/KEGG)",
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="Output SQLite database (e.g. data/reference/KEGG/kegg.sqlite)",
+    )
+    parser.add_argument(
+        "--species",
+        nargs="+",
+        default=None,
+        help="KEGG organism codes to (re)load (default: every organism in --kegg-dir)",
+    )
+    args = parser.parse_args()
+
+    build_kegg_db(Path(args.kegg_dir), Path(args.output), args.species)
+
+
+if __name__ == "__main__":
+    main()
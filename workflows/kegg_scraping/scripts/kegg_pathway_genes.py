@@ -6,14 +6,28 @@
 # Usage:
 #   python kegg_pathway_genes.py --pathways map00660 --species sbi \
 #       --kegg-dir data/reference/KEGG --output results/kegg/sbi_map00660_genes.tsv
+#   python kegg_pathway_genes.py --pathways map00660 map00020 --species atted-plants \
+#       --kegg-dir data/reference/KEGG --output results/kegg/ --workers 6
 
 import argparse
+import gzip
+import io
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
 
 import pandas as pd
 
 WDIR = Path(__file__).resolve().parents[3]
 
+OUTPUT_COLS = ["species", "pathway", "gene", "ncbi_geneid", "ko", "ncbi_proteinid"]
+
+# namespace prefix ("sbi:", "path:", "ncbi-geneid:", ...) at the start of every field
+KEGG_PREFIX = re.compile(rb"^[^\t:\n]*:|(?<=\t)[^\t:\n]*:", re.M)
+
 
 # ---------------------------------------------------------------------------
 # helpers
@@ -24,22 +38,31 @@ def parse_kegg_list(filepath, col_names=("source", "target")):
     Parse a KEGG two-column tab-separated .list file into a DataFrame.
 
     Namespace prefixes (e.g. 'sbi:', 'ko:', 'path:') are stripped
-    automatically so that downstream joins use bare identifiers.
+    automatically so that downstream joins use bare identifiers. The
+    stripping runs as one regex substitution over the raw file before
+    parsing, which is several times faster than a per-row str.split on
+    the large (ath/zma/taes) lists. Gzipped lists (``.list.gz``, as
+    mirrored from the FTP) are decompressed on the fly.
     """
-    df = pd.read_csv(filepath, sep="\t", header=None, names=col_names)
-    for col in df.columns:
-        df[col] = df[col].str.split(":", n=1).str[1]
-    return df
+    data = Path(filepath).read_bytes()
+    if Path(filepath).suffix == ".gz":
+        data = gzip.decompress(data)
+    data = KEGG_PREFIX.sub(b"", data)
+    return pd.read_csv(io.BytesIO(data), sep="\t", header=None, names=col_names, dtype=str)
 
 
-def get_pathway_genes(pathway, species, kegg_dir):
+def get_species_pathway_genes(pathways, species, kegg_dir):
     """
-    Return a DataFrame of species genes in *pathway* with annotations.
+    Return a DataFrame of species genes in any of *pathways* with annotations.
+
+    Each of the four species lists is parsed once; genes of all requested
+    pathways are selected with a single ``isin`` and annotated with one set
+    of joins. Split the result per pathway with ``groupby("pathway")``.
 
     Parameters
     ----------
-    pathway : str
-        Reference pathway id, e.g. ``map00660``.
+    pathways : list[str]
+        Reference pathway ids, e.g. ``["map00660", "map00020"]``.
     species : str
         KEGG three-letter species code, e.g. ``sbi``.
     kegg_dir : Path
@@ -49,20 +72,23 @@ def get_pathway_genes(pathway, species, kegg_dir):
     Returns
     -------
     pd.DataFrame
-        Columns: gene, ko, ncbi_geneid, ncbi_proteinid
+        Columns: pathway (reference ``map`` id), gene, ncbi_geneid, ko, ncbi_proteinid
     """
     org_dir = kegg_dir / species
-    pathway_id = pathway.replace("map", species)  # map00660 -> sbi00660 if species is not "all". Otherwise, retain.
-    
+    # map00660 -> sbi00660 if species is not "all". Otherwise, retain.
+    pathway_ids = {pathway.replace("map", species): pathway for pathway in pathways}
+
     print(f"Preparing species name: {species}")
 
-    # 1. genes in this pathway
+    # 1. genes in the requested pathways
     print(f"[1/4] Parsing {species}_pathway.list ...")
     sp_pathway = parse_kegg_list(
         org_dir / f"{species}_pathway.list", ("gene", "pathway")
     )
-    genes = sp_pathway.loc[sp_pathway["pathway"] == pathway_id, ["gene"]].copy()
-    print(f"      Found {len(genes)} {species} genes in pathway {pathway_id}")
+    genes = sp_pathway.loc[sp_pathway["pathway"].isin(pathway_ids.keys()), ["pathway", "gene"]].copy()
+    genes["pathway"] = genes["pathway"].map(pathway_ids)
+    for pathway, n in genes["pathway"].value_counts().reindex(pathways, fill_value=0).items():
+        print(f"      Found {n} {species} genes in pathway {pathway.replace('map', species)}")
 
     # 2. genes in EGI format (ncbi gene id)
     print(f"[2/4] Parsing {species}_ncbi-geneid.list ...")
@@ -85,6 +111,42 @@ def get_pathway_genes(pathway, species, kegg_dir):
 
     return genes
 
+
+def get_pathway_genes(pathway, species, kegg_dir):
+    """
+    Return a DataFrame of species genes in a single *pathway* with annotations.
+
+    Columns: gene, ko, ncbi_geneid, ncbi_proteinid. Prefer
+    ``get_species_pathway_genes`` when several pathways are needed.
+    """
+    return get_species_pathway_genes([pathway], species, kegg_dir).drop(columns="pathway")
+
+def bounded_map(pool, fn, items, window):
+    """
+    Like ``pool.map(fn, items)``, but with at most *window* tasks submitted
+    and not yet consumed, so finished results cannot pile up in memory while
+    an earlier species is still running.
+    """
+    items = iter(items)
+    pending = deque(pool.submit(fn, item) for item in islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        pending.extend(pool.submit(fn, item) for item in islice(items, 1))
+        yield result
+
+def write_species_results(species, results, handles, counts):
+    """
+    Append each species' genes to the open per-pathway TSV handles.
+
+    *results* yields one ``get_species_pathway_genes`` DataFrame per entry
+    of *species* (in the same order); *counts* is updated in place.
+    """
+    for sp, df in zip(species, results):
+        df.insert(0, "species", sp)
+        for pathway, sub_df in df.groupby("pathway", sort=False):
+            sub_df[OUTPUT_COLS].to_csv(handles[pathway], sep="\t", index=False, header=False)
+            counts[pathway] += len(sub_df)
+
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
@@ -116,11 +178,25 @@ def main():
         default=str(WDIR / 'data/reference/KEGG'),
         help="Root of the local KEGG FTP mirror (default: data/reference/KEGG)",
     )
+    parser.add_argument(
+        "--kegg-db",
+        default=None,
+        help=(
+            "Compiled KEGG database from kegg_db.py; when given, genes are "
+            "looked up there instead of parsing the .list files"
+        ),
+    )
     parser.add_argument(
         "--output",
         required=True,
         help="Output directory for TSV files (one file per pathway, e.g. results/kegg/)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of species processed concurrently (default: 1)",
+    )
 
     args = parser.parse_args()
 
@@ -145,19 +221,34 @@ def main():
     output.mkdir(parents=True, exist_ok=True)
     species_label = args.species[0] if len(args.species) == 1 else "_".join(args.species[:2])
 
-    for pathway in pathways:
-        dfs = []
-        for sp in species:
-            df = get_pathway_genes(pathway, sp, kegg_dir)
-            df.insert(0, "pathway", pathway)
-            df.insert(0, "species", sp)
-            dfs.append(df)
-        pathway_df = pd.concat(dfs, ignore_index=True)
-
-        outfile = output / f"{species_label}_{pathway}_genes.tsv"
-        pathway_df.to_csv(outfile, sep="\t", index=False)
-        print(f"\nSaved {len(pathway_df)} genes → {outfile}")
-
+    # one pass over each species' lists covers every requested pathway;
+    # species results are appended to the per-pathway TSVs as they arrive
+    # (in species order); bounded_map keeps at most 2 x `workers` species
+    # in flight, so memory does not grow with the number of species
+    outfiles = {p: output / f"{species_label}_{p}_genes.tsv" for p in pathways}
+    handles = {p: open(f, "w") for p, f in outfiles.items()}
+    counts = dict.fromkeys(pathways, 0)
+    for h in handles.values():
+        h.write("\t".join(OUTPUT_COLS) + "\n")
+
+    if args.kegg_db:
+        from kegg_db import query_species_pathway_genes
+        extract = partial(query_species_pathway_genes, args.kegg_db, pathways)
+    else:
+        extract = partial(get_species_pathway_genes, pathways, kegg_dir=kegg_dir)
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                results = bounded_map(pool, extract, species, 2 * args.workers)
+                write_species_results(species, results, handles, counts)
+        else:
+            write_species_results(species, map(extract, species), handles, counts)
+    finally:
+        for h in handles.values():
+            h.close()
+
+    for pathway, outfile in outfiles.items():
+        print(f"\nSaved {counts[pathway]} genes → {outfile}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,80 +1,391 @@
 # workflows/kegg_scraping/scripts/obtain_aa_sequences.py
 #
 # Extract amino acid sequences from KEGG .pep files for a list of sp:geneid pairs.
+# Each .pep gets a persistent offset index ({pep}.idx, built on first use and
+# rebuilt whenever the .pep changes), so only the requested records are read.
 #
 # Usage:
 #   python obtain_aa_sequences.py --input {spgeneid_txt} --kegg-dir {kegg_dir} --output {out.faa}
 #   python workflows/kegg_scraping/scripts/obtain_aa_sequences.py --input results/by_ko/map00020-K00025_kegg/map00020-K00025_kegg-01-pathway_genes_from_KEGG.txt --kegg-dir data/reference/KEGG --output results/hmm_homology/map00020-K00025_kegg/map00020-K00025_kegg-03.faa
+#   python obtain_aa_sequences.py --input {spgeneid_txt} --kegg-db data/reference/KEGG/kegg.sqlite --output {out.faa}
+#   python obtain_aa_sequences.py --manifest {manifest_tsv} --kegg-dir {kegg_dir}
+#   python obtain_aa_sequences.py --manifest {manifest_tsv} --kegg-db data/reference/KEGG/kegg.sqlite
 #       
 
 import argparse
+import mmap
+import os
 from pathlib import Path
 
+PEP_INDEX_SUFFIX = ".idx"
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Extract AA sequences from KEGG .pep files for a list of sp:geneid pairs."
-    )
-    parser.add_argument("--input",    required=True, help="sp:geneid list (one per line, 02-spgeneid.txt)")
-    parser.add_argument("--kegg-dir", required=True, help="Root of local KEGG FTP mirror (contains sp/ subdirs)")
-    parser.add_argument("--output",   required=True, help="Output FASTA file")
-    args = parser.parse_args()
 
-    input_path  = Path(args.input)
-    kegg_dir    = Path(args.kegg_dir)
-    output_path = Path(args.output)
+# ---------------------------------------------------------------------------
+# .pep offset index
+# ---------------------------------------------------------------------------
+
+def scan_pep_records(pep_file):
+    """
+    Yield (spgeneid, offset, length) for every record of a .pep FASTA file;
+    offset/length delimit the record bytes (header line included).
+    """
+    record_id, record_start, offset = None, 0, 0
+    with open(pep_file, "rb") as f:
+        for line in f:
+            if line[:1] == b">":
+                if record_id is not None:
+                    yield record_id, record_start, offset - record_start
+                record_id = line[1:].split()[0].decode()
+                record_start = offset
+            offset += len(line)
+    if record_id is not None:
+        yield record_id, record_start, offset - record_start
+
+
+def pep_signature(pep_file):
+    """Size and mtime of the .pep, stored in the index to detect staleness."""
+    st = os.stat(pep_file)
+    return f"{st.st_size}\t{st.st_mtime_ns}"
+
+
+def build_pep_index(pep_file):
+    """
+    Scan *pep_file* once and write its offset index next to it
+    (``{pep}.idx``: one ``spgeneid<TAB>offset<TAB>length`` line per record,
+    after a ``#size<TAB>mtime_ns`` line identifying the indexed .pep).
+    The index is written to a temporary file and renamed, so concurrent
+    jobs never read a partial index. Returns {spgeneid: (offset, length)};
+    the first record wins when an ID occurs twice.
+    """
+    index_path = Path(f"{pep_file}{PEP_INDEX_SUFFIX}")
+    index = {}
+    for record_id, offset, length in scan_pep_records(pep_file):
+        index.setdefault(record_id, (offset, length))
+
+    tmp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(f"#{pep_signature(pep_file)}\n")
+        for record_id, (offset, length) in index.items():
+            f.write(f"{record_id}\t{offset}\t{length}\n")
+    os.replace(tmp_path, index_path)
+    return index
+
+
+def load_pep_index(pep_file):
+    """
+    Return {spgeneid: (offset, length)} for *pep_file*, reading the
+    persistent index when it matches the current .pep and (re)building it
+    otherwise.
+    """
+    index_path = Path(f"{pep_file}{PEP_INDEX_SUFFIX}")
+    if index_path.exists():
+        with open(index_path) as f:
+            if f.readline().rstrip("\n") == f"#{pep_signature(pep_file)}":
+                index = {}
+                for line in f:
+                    record_id, offset, length = line.rstrip("\n").split("\t")
+                    index[record_id] = (int(offset), int(length))
+                return index
+        print(f"Offset index {index_path.name} is out of date, rebuilding")
+    else:
+        print(f"Building offset index {index_path.name}")
+    return build_pep_index(pep_file)
+
+
+def write_records(pep_file, spans, out_f, use_mmap=False):
+    """
+    Copy the records at *spans* [(spgeneid, offset, length), ...] from
+    *pep_file* to *out_f* as ``>spgeneid`` + sequence lines, in offset
+    order. Records without sequence lines are skipped. Returns the number
+    of records written.
+    """
+    found = 0
+    with open(pep_file, "rb") as pep_f:
+        buf = mmap.mmap(pep_f.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else None
+        try:
+            for spgeneid, offset, length in sorted(spans, key=lambda s: s[1]):
+                if buf is not None:
+                    record = buf[offset:offset + length]
+                else:
+                    pep_f.seek(offset)
+                    record = pep_f.read(length)
+                newline = record.find(b"\n")
+                seq = record[newline + 1:].decode() if newline >= 0 else ""
+                if seq:
+                    out_f.write(f">{spgeneid}\n")
+                    out_f.write(seq)
+                    found += 1
+        finally:
+            if buf is not None:
+                buf.close()
+    return found
+
+
+# ---------------------------------------------------------------------------
+# extraction
+# ---------------------------------------------------------------------------
+
+def species_pep_files(gene_ids, kegg_dir):
+    """Yield (species, .pep path, its gene IDs) for every species in *gene_ids*."""
+    species = {gid.split(':')[0] for gid in gene_ids}
+    for sp in sorted(species):
+        pep_files = list((kegg_dir / sp).glob("*.pep"))
+        if not pep_files:
+            print(f"WARNING: no .pep file found for species {sp}, skipping")
+            continue
+        pep_file = pep_files[0]   # each species has exactly one .pep
+        yield sp, pep_file, {gid for gid in gene_ids if gid.startswith(sp + ':')}
+
+
+def extract_indexed(gene_ids, kegg_dir, out_f, use_mmap=False):
+    """
+    Write the sequences of *gene_ids* by looking them up in each species'
+    .pep offset index and reading only those records.
+    """
+    found = 0
+    for sp, pep_file, sp_gene_ids in species_pep_files(gene_ids, kegg_dir):
+        index = load_pep_index(pep_file)
+        spans = [(gid, *index[gid]) for gid in sp_gene_ids if gid in index]
+        found += write_records(pep_file, spans, out_f, use_mmap)
+    return found
+
+
+def extract_from_pep(gene_ids, kegg_dir, out_f):
+    """
+    Write the sequences of *gene_ids* by scanning each species' .pep file.
+    """
+    found = 0
+    for sp, pep_file, sp_gene_ids in species_pep_files(gene_ids, kegg_dir):
+        current_id  = None
+        current_seq = []
+
+        with open(pep_file) as pep_f:
+            for line in pep_f:
+                if line.startswith('>'):
+                    # flush previous matching record
+                    if current_id and current_seq:
+                        out_f.write(f">{current_id}\n")
+                        out_f.write(''.join(current_seq))
+                        found += 1
+                    # check new header: ">sp:geneid  description"
+                    header_id  = line[1:].split()[0]   # e.g. "sbi:8055458"
+                    current_id = header_id if header_id in sp_gene_ids else None
+                    current_seq = []
+                else:
+                    if current_id:
+                        current_seq.append(line)
+            # flush last record
+            if current_id and current_seq:
+                out_f.write(f">{current_id}\n")
+                out_f.write(''.join(current_seq))
+                found += 1
+    return found
+
+
+def extract_from_db(gene_ids, kegg_db, out_f, use_mmap=False):
+    """
+    Write the sequences of *gene_ids* by seeking to their record offsets
+    as stored in the compiled KEGG database (kegg_db.py).
+    """
+    from kegg_db import query_pep_records
+
+    records = query_pep_records(kegg_db, gene_ids).sort_values(["species", "offset"])
+    found = 0
+    for pep_file, recs in records.groupby("pep_file", sort=False):
+        spans = zip(recs["spgeneid"], recs["offset"], recs["length"])
+        found += write_records(pep_file, spans, out_f, use_mmap)
+    return found
+
 
+def extract_batch(jobs, kegg_dir):
+    """
+    Batch mode: serve many (spgeneid list, output FASTA) jobs with a single
+    pass over each species' .pep file.
+
+    The requested IDs of all jobs are merged into one lookup of
+    sp:geneid -> jobs; every matching record is appended to each job that
+    asked for it, and the per-job FASTAs are written at the end (in the same
+    record order as the single-job scan).
+
+    Parameters
+    ----------
+    jobs : list[tuple[set[str], Path]]
+        Requested sp:geneid set and output path of every job.
+    kegg_dir : Path
+        Root of the local KEGG FTP mirror.
+
+    Returns
+    -------
+    list[int] — number of sequences written per job.
+    """
+    wanted = {}
+    for i, (gene_ids, _) in enumerate(jobs):
+        for gid in gene_ids:
+            wanted.setdefault(gid, []).append(i)
+    records = [[] for _ in jobs]
+
+    for sp, pep_file, _ in species_pep_files(wanted, kegg_dir):
+        current_jobs, current = None, []
+        with open(pep_file, "rb") as pep_f:
+            for line in pep_f:
+                if line[:1] == b">":
+                    if current_jobs and len(current) > 1:
+                        for i in current_jobs:
+                            records[i].append(current)
+                    header_id    = line[1:].split()[0].decode()
+                    current_jobs = wanted.get(header_id)
+                    current      = [f">{header_id}\n".encode()]
+                elif current_jobs:
+                    current.append(line)
+            if current_jobs and len(current) > 1:
+                for i in current_jobs:
+                    records[i].append(current)
+
+    for (_, output_path), recs in zip(jobs, records):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "wb") as out_f:
+            for rec in recs:
+                out_f.writelines(rec)
+    return [len(recs) for recs in records]
+
+
+def extract_batch_from_db(jobs, kegg_db):
+    """
+    Batch mode through the compiled KEGG database: the IDs of all *jobs*
+    are looked up in one query and every .pep is opened once, reading the
+    requested records in offset order. Same jobs/return value as
+    extract_batch.
+    """
+    from kegg_db import query_pep_records
+
+    wanted = {}
+    for i, (gene_ids, _) in enumerate(jobs):
+        for gid in gene_ids:
+            wanted.setdefault(gid, []).append(i)
+    records = [[] for _ in jobs]
+
+    found = query_pep_records(kegg_db, wanted).sort_values(["species", "offset"])
+    for pep_file, recs in found.groupby("pep_file", sort=False):
+        with open(pep_file, "rb") as pep_f:
+            for spgeneid, offset, length in zip(recs["spgeneid"], recs["offset"], recs["length"]):
+                pep_f.seek(offset)
+                record = pep_f.read(length)
+                newline = record.find(b"\n")
+                seq = record[newline + 1:] if newline >= 0 else b""
+                if seq:
+                    for i in wanted[spgeneid]:
+                        records[i].append([f">{spgeneid}\n".encode(), seq])
+
+    for (_, output_path), recs in zip(jobs, records):
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "wb") as out_f:
+            for rec in recs:
+                out_f.writelines(rec)
+    return [len(recs) for recs in records]
+
+
+def read_gene_ids(input_path):
+    """Return the set of sp:geneid entries of a 02-spgeneid.txt file."""
+    input_path = Path(input_path)
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    # Read gene IDs and group by species
     gene_ids = set()
     with open(input_path) as f:
         for line in f:
             gid = line.strip()
             if gid:
                 gene_ids.add(gid)   # e.g. "sbi:8055458", "ath:AT1G31180"
+    return gene_ids
+
+
+def read_manifest(manifest_path):
+    """
+    Read a batch manifest: one ``spgeneid_txt<TAB>output_faa`` pair per line
+    (blank lines and lines starting with '#' are ignored).
+    """
+    pairs = []
+    with open(manifest_path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            input_path, output_path = line.rstrip("\n").split("\t")[:2]
+            pairs.append((input_path, output_path))
+    return pairs
 
-    species = {gid.split(':')[0] for gid in gene_ids}
 
+def extract_sequences(input_path, output_path, kegg_dir=None, kegg_db=None,
+                      use_mmap=False, use_index=True):
+    """
+    Write the sequences of the sp:geneid list *input_path* to the FASTA
+    *output_path*: through the compiled database when *kegg_db* is given,
+    otherwise through the .pep offset index under *kegg_dir* (or a full
+    scan with use_index=False). Returns (sequences written, IDs requested).
+    """
+    if not (kegg_dir or kegg_db):
+        raise ValueError("one of kegg_dir or kegg_db is required")
+
+    gene_ids    = read_gene_ids(input_path)
+    output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    found = 0
     with open(output_path, 'w') as out_f:
-        for sp in sorted(species):
-            pep_files = list((kegg_dir / sp).glob("*.pep"))
-            if not pep_files:
-                print(f"WARNING: no .pep file found for species {sp}, skipping")
-                continue
-            pep_file = pep_files[0]   # each species has exactly one .pep
-
-            sp_gene_ids = {gid for gid in gene_ids if gid.startswith(sp + ':')}
-            current_id  = None
-            current_seq = []
-
-            with open(pep_file) as pep_f:
-                for line in pep_f:
-                    if line.startswith('>'):
-                        # flush previous matching record
-                        if current_id and current_seq:
-                            out_f.write(f">{current_id}\n")
-                            out_f.write(''.join(current_seq))
-                            found += 1
-                        # check new header: ">sp:geneid  description"
-                        header_id  = line[1:].split()[0]   # e.g. "sbi:8055458"
-                        current_id = header_id if header_id in sp_gene_ids else None
-                        current_seq = []
-                    else:
-                        if current_id:
-                            current_seq.append(line)
-                # flush last record
-                if current_id and current_seq:
-                    out_f.write(f">{current_id}\n")
-                    out_f.write(''.join(current_seq))
-                    found += 1
+        if kegg_db:
+            found = extract_from_db(gene_ids, kegg_db, out_f, use_mmap)
+        elif not use_index:
+            found = extract_from_pep(gene_ids, Path(kegg_dir), out_f)
+        else:
+            found = extract_indexed(gene_ids, Path(kegg_dir), out_f, use_mmap)
+    return found, len(gene_ids)
+
+
+def extract_sequences_batch(pairs, kegg_dir=None, kegg_db=None):
+    """
+    Batch form of extract_sequences for [(spgeneid_txt, output_faa), ...];
+    every .pep is read once, through the compiled database when *kegg_db* is
+    given. Returns (sequences written, IDs requested).
+    """
+    if not (kegg_dir or kegg_db):
+        raise ValueError("one of kegg_dir or kegg_db is required")
+    jobs = [(read_gene_ids(input_path), Path(output_path)) for input_path, output_path in pairs]
+    counts = extract_batch_from_db(jobs, kegg_db) if kegg_db else extract_batch(jobs, Path(kegg_dir))
+    return sum(counts), sum(len(gene_ids) for gene_ids, _ in jobs)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract AA sequences from KEGG .pep files for a list of sp:geneid pairs."
+    )
+    parser.add_argument("--input",    help="sp:geneid list (one per line, 02-spgeneid.txt)")
+    parser.add_argument("--kegg-dir", help="Root of local KEGG FTP mirror (contains sp/ subdirs)")
+    parser.add_argument("--kegg-db",  help="Compiled KEGG database (kegg_db.py); replaces the .pep scan with indexed lookups")
+    parser.add_argument("--output",   help="Output FASTA file")
+    parser.add_argument("--manifest", help="Batch mode: TSV of (spgeneid list, output FASTA) pairs served by one pass over each .pep")
+    parser.add_argument("--mmap",     action="store_true", help="Read records through a memory map instead of seek/read")
+    parser.add_argument("--no-index", action="store_true", help="Scan the whole .pep files instead of using their offset index")
+    args = parser.parse_args()
+
+    if args.manifest:
+        if not (args.kegg_dir or args.kegg_db):
+            parser.error("--manifest requires --kegg-dir or --kegg-db")
+        pairs = read_manifest(args.manifest)
+        found, total = extract_sequences_batch(pairs, args.kegg_dir, args.kegg_db)
+        print(f"Wrote {found}/{total} sequences to {len(pairs)} FASTA files from {args.manifest}")
+        return
+
+    if not (args.input and args.output):
+        parser.error("--input and --output are required unless --manifest is given")
+    if not (args.kegg_dir or args.kegg_db):
+        parser.error("one of --kegg-dir or --kegg-db is required")
 
-    missing = len(gene_ids) - found
-    print(f"Wrote {found}/{len(gene_ids)} sequences to {output_path}" +
+    found, total = extract_sequences(args.input, args.output, args.kegg_dir, args.kegg_db,
+                                     use_mmap=args.mmap, use_index=not args.no_index)
+    missing = total - found
+    print(f"Wrote {found}/{total} sequences to {args.output}" +
           (f" ({missing} IDs not found in pep files)" if missing else ""))
 
 
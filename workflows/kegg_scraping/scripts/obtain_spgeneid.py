@@ -5,27 +5,21 @@
 #
 # Usage:
 #   python obtain_spgeneid.py --input {pathway_genes_tsv} --output {spgeneid_txt}
+#   python obtain_spgeneid.py --input {pathway_genes_tsv} --output {spgeneid_txt} \
+#       --kegg-db data/reference/KEGG/kegg.sqlite
 
 import argparse
 from pathlib import Path
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Extract sp:geneid pairs from a per-KO pathway gene TSV."
-    )
-    parser.add_argument("--input",  required=True, help="Per-KO pathway gene TSV (01-pathway_genes_from_KEGG.txt)")
-    parser.add_argument("--output", required=True, help="Output txt file, one sp:geneid per line")
-    args = parser.parse_args()
-
-    input_path  = Path(args.input)
-    output_path = Path(args.output)
-
+def read_spgeneids(input_path):
+    """
+    Return the sp:geneid of every row of a per-KO pathway gene TSV, in file order.
+    """
+    input_path = Path(input_path)
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
     # TSV columns: species | gene | ncbi_geneid | ko | ncbi_proteinid
     # 'gene' (col 1) is the KEGG gene ID, which matches pep file headers (>sp:geneid)
     out = []
@@ -38,12 +32,52 @@ def main():
             sp   = parts[0]          # e.g. sbi
             gid  = parts[1]          # e.g. AT1G31180 or 8055458 (KEGG gene ID)
             out.append(f"{sp}:{gid}")
+    return out
+
+
+def keep_with_sequence(spgeneids, kegg_db):
+    """
+    Drop the sp:geneid entries that have no sequence in the compiled KEGG
+    database (kegg_db.py). Returns (kept entries, number dropped).
+    """
+    from kegg_db import query_pep_records
 
+    with_seq = set(query_pep_records(kegg_db, spgeneids)["spgeneid"])
+    kept = [entry for entry in spgeneids if entry in with_seq]
+    return kept, len(spgeneids) - len(kept)
+
+
+def write_spgeneids(input_path, output_path, kegg_db=None):
+    """
+    Write the sp:geneid list (02-spgeneid.txt) of a per-KO pathway gene TSV;
+    with *kegg_db*, only IDs that have a sequence are kept.
+    Returns the written entries.
+    """
+    out = read_spgeneids(input_path)
+    if kegg_db:
+        out, dropped = keep_with_sequence(out, kegg_db)
+        if dropped:
+            print(f"Dropped {dropped} sp:geneid entries without a sequence in {kegg_db}")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, 'w') as w:
         for entry in out:
             w.write(entry + '\n')
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract sp:geneid pairs from a per-KO pathway gene TSV."
+    )
+    parser.add_argument("--input",  required=True, help="Per-KO pathway gene TSV (01-pathway_genes_from_KEGG.txt)")
+    parser.add_argument("--output", required=True, help="Output txt file, one sp:geneid per line")
+    parser.add_argument("--kegg-db", help="Compiled KEGG database (kegg_db.py); keep only IDs that have a sequence")
+    args = parser.parse_args()
 
-    print(f"Wrote {len(out)} sp:geneid entries to {output_path}")
+    out = write_spgeneids(args.input, args.output, args.kegg_db)
+    print(f"Wrote {len(out)} sp:geneid entries to {args.output}")
 
 
 if __name__ == "__main__":
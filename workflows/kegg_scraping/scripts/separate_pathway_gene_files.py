@@ -45,6 +45,25 @@ def save_outfile(sub_df, output_path):
     output_path.parent.mkdir(parents=True, exist_ok=True)
     cols = [c for c in sub_df.columns if c != 'pathway']
     sub_df[cols].to_csv(output_path, sep='\t', index=False)
+
+def split_by_ko(input, pathway, output_dir):
+    """
+    Split one pathway gene file into per-KO files under output_dir.
+    Returns dict[str, Path] of seed name -> written file,
+    e.g. {"map00660-K01703": .../map00660-K01703_kegg/map00660-K01703_kegg-01-pathway_genes_from_KEGG.txt}
+    """
+    if not Path(input).exists():
+        raise FileNotFoundError(f'Input TSV file {input} not found')
+    # ensure output directory exists before iterating (required for Snakemake directory() output)
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    written = {}
+    for ko, sub_df in separate_by_orthology(parse_input_file(input)).items():
+        seed = f"{pathway}-{ko}"
+        out = Path(output_dir) / f"{seed}_kegg" / f"{seed}_kegg-01-pathway_genes_from_KEGG.txt"
+        save_outfile(sub_df, out)
+        written[seed] = out
+    return written
     
 
 # ---------------------------------------------------------------------------
@@ -72,21 +91,10 @@ def main():
     )
     args = parser.parse_args()
 
-    pathway = args.pathway
-    input = args.input
     output_prefix = args.output # prefix of the Output file name must be specified for the subsequent Snakemake 
 
-    if Path(input).exists():
-        # ensure output directory exists before iterating (required for Snakemake directory() output)
-        Path(output_prefix).mkdir(parents=True, exist_ok=True)
-        # main executor
-        input_df = parse_input_file(input)
-        for ko, sub_df in separate_by_orthology(input_df).items():
-            out = Path(output_prefix) / f"{pathway}-{ko}_kegg" / f"{pathway}-{ko}_kegg-01-pathway_genes_from_KEGG.txt"
-            save_outfile(sub_df, out)
-            print(f"Saved {pathway}-{ko} file as {out}")
-    else:
-        raise FileNotFoundError(f'Input TSV file {input} not found')
+    for seed, out in split_by_ko(args.input, args.pathway, output_prefix).items():
+        print(f"Saved {seed} file as {out}")
     
     
 
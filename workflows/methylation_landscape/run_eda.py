@@ -3,7 +3,7 @@
 Methylation Landscape EDA — standalone script
 ==============================================
 Headless equivalent of methylation_landscape.ipynb.
-Produces seven PDF figures in --out-dir.
+Produces nine PDF figures, a window methylation matrix and a metagene profile table in --out-dir.
 
 Usage (from project root, no args required):
     python workflows/methylation_landscape/run_eda.py
@@ -65,6 +65,18 @@ SAMPLE_META = {
 # Helpers
 # ─────────────────────────────────────────────────────────────────────────────
 
+def sample_style(samples):
+    """
+    {sample: {'label', 'color'}} for any number of samples: the SAMPLE_META
+    entry where one exists, otherwise the sample name and a distinct colour.
+    """
+    extra   = [s for s in samples if s not in SAMPLE_META]
+    palette = sns.color_palette('husl', len(extra)).as_hex() if extra else []
+    style   = {s: SAMPLE_META[s] for s in samples if s in SAMPLE_META}
+    style.update({s: {'label': s, 'color': c} for s, c in zip(extra, palette)})
+    return style
+
+
 def load_bedmethyl(path, usecols=None, extra_dtypes=None):
     dtypes = {'chrom': str, 'start': int, 'end': int, 'strand': str,
               'N_valid_cov': int, 'pct_mod': float, 'N_mod': int}
@@ -87,6 +99,22 @@ def discover_available(results_dir, samples, contexts):
     return avail
 
 
+def load_gene_bed(ref_gff):
+    """Gene features of a GFF3 as a BED6 DataFrame (0-based start, name 'gene_body')."""
+    GFF_COLS = ['seqid', 'source', 'type', 'start', 'end',
+                'score', 'strand', 'phase', 'attributes']
+    gff   = pd.read_csv(ref_gff, sep='\t', comment='#', header=None,
+                        names=GFF_COLS, dtype={'start': int, 'end': int})
+    genes = gff[gff['type'] == 'gene']
+    return pd.DataFrame({
+        'chrom':  genes['seqid'].values,
+        'start':  genes['start'].values - 1,
+        'end':    genes['end'].values,
+        'name':   'gene_body', 'score': 0,
+        'strand': genes['strand'].values,
+    })
+
+
 def classify_contexts(df, fasta):
     """
     Add 'context' (CG / CHG / CHH) to a bedMethyl DataFrame.
@@ -214,28 +242,16 @@ def section2(results_dir, available, ref_gff, out_dir, tmpdir, sample_order,
         return {}
 
     # Parse GFF3
-    GFF_COLS = ['seqid', 'source', 'type', 'start', 'end',
-                'score', 'strand', 'phase', 'attributes']
-    gff   = pd.read_csv(ref_gff, sep='\t', comment='#', header=None,
-                        names=GFF_COLS, dtype={'start': int, 'end': int})
-    genes = gff[gff['type'] == 'gene'].copy()
-    log.info(f'  {len(genes):,} gene features loaded from GFF3')
-
-    gene_bed = pd.DataFrame({
-        'chrom':  genes['seqid'].values,
-        'start':  genes['start'].values - 1,
-        'end':    genes['end'].values,
-        'name':   'gene_body', 'score': 0,
-        'strand': genes['strand'].values,
-    })
+    gene_bed = load_gene_bed(ref_gff)
+    log.info(f'  {len(gene_bed):,} gene features loaded from GFF3')
 
-    plus_mask   = genes['strand'].values == '+'
-    tss         = np.where(plus_mask, genes['start'].values - 1, genes['end'].values)
+    plus_mask   = gene_bed['strand'].values == '+'
+    tss         = np.where(plus_mask, gene_bed['start'].values, gene_bed['end'].values)
     promo_start = np.where(plus_mask, np.maximum(0, tss - promoter_bp), tss)
     promo_end   = np.where(plus_mask, tss, tss + promoter_bp)
     promoter_bed = pd.DataFrame({
-        'chrom': genes['seqid'].values, 'start': promo_start, 'end': promo_end,
-        'name': 'promoter', 'score': 0, 'strand': genes['strand'].values,
+        'chrom': gene_bed['chrom'].values, 'start': promo_start, 'end': promo_end,
+        'name': 'promoter', 'score': 0, 'strand': gene_bed['strand'].values,
     })
     promoter_bed = promoter_bed[promoter_bed['start'] < promoter_bed['end']].copy()
 
@@ -339,40 +355,127 @@ def section2(results_dir, available, ref_gff, out_dir, tmpdir, sample_order,
 # Section 3 — PCA and hierarchical clustering
 # ─────────────────────────────────────────────────────────────────────────────
 
-def section3(results_dir, available, out_dir, min_cov=5, top_n_sites=50_000):
+def common_site_matrix(results_dir, samples, tmpdir, min_cov, chunk_size=5_000_000):
+    """
+    Methylation of the CpGs covered ≥ min_cov in every sample as a float32
+    memmap (n_samples × n_common_sites) in tmpdir.
+
+    Pass 1 writes every sample's sorted (chrom code, start) int64 keys and
+    pct_mod values to .npy and intersects the keys; pass 2 fills the matrix
+    one sample row and chunk of sites at a time, so only one sample's sites
+    are ever held in RAM.
+    """
+    chrom_codes, common = {}, None
+    for sample in samples:
+        fpath = results_dir / 'CpG' / sample / f'{sample}.bedMethyl'
+        log.info(f'  Loading {sample} ...')
+        bm = load_bedmethyl(fpath, usecols=[0, 1, 9, 10], extra_dtypes={'chrom': 'category'})
+        bm = bm[bm['N_valid_cov'] >= min_cov]
+        lut  = np.array([chrom_codes.setdefault(c, len(chrom_codes))
+                         for c in bm['chrom'].cat.categories], dtype=np.int64)
+        keys = (lut[bm['chrom'].cat.codes.to_numpy()] << 32) | bm['start'].to_numpy(np.int64)
+        keys, first = np.unique(keys, return_index=True)
+        np.save(tmpdir / f'{sample}_pca_keys.npy', keys)
+        np.save(tmpdir / f'{sample}_pca_values.npy', bm['pct_mod'].to_numpy(np.float32)[first])
+        common = keys if common is None else np.intersect1d(common, keys, assume_unique=True)
+        log.info(f'    {len(keys):,} sites (cov ≥ {min_cov}) | {len(common):,} common so far')
+        del bm, keys, first
+
+    X = np.lib.format.open_memmap(tmpdir / 'pca_common_sites.npy', mode='w+',
+                                  dtype=np.float32, shape=(len(samples), len(common)))
+    for i, sample in enumerate(samples):
+        keys   = np.load(tmpdir / f'{sample}_pca_keys.npy', mmap_mode='r')
+        values = np.load(tmpdir / f'{sample}_pca_values.npy', mmap_mode='r')
+        for start in range(0, len(common), chunk_size):
+            X[i, start:start + chunk_size] = values[np.searchsorted(keys, common[start:start + chunk_size])]
+    X.flush()
+    return X
+
+
+def streamed_pca(X, n_components, max_block=8_000_000):
+    """
+    Exact PCA of X (n_samples × n_sites) with every site standardised as by
+    StandardScaler. Site chunks are streamed into the n_samples × n_samples
+    Gram matrix, whose eigenvectors give the sample scores — with far fewer
+    samples than sites this needs no dense copy of X and no approximation.
+    Returns (scores, explained variance ratio).
+    """
+    n_samples, n_sites = X.shape
+    chunk = max(1, max_block // n_samples)
+    gram  = np.zeros((n_samples, n_samples))
+    for start in range(0, n_sites, chunk):
+        block = np.asarray(X[:, start:start + chunk], dtype=np.float64)
+        block -= block.mean(axis=0)
+        std = block.std(axis=0)
+        block /= np.where(std > 0, std, 1.0)
+        gram += block @ block.T
+
+    eigval, eigvec = np.linalg.eigh(gram)
+    order  = np.argsort(eigval)[::-1]
+    eigval = np.clip(eigval[order], 0, None)
+    eigvec = eigvec[:, order[:n_components]]
+    eigvec *= np.sign(eigvec[np.abs(eigvec).argmax(axis=0), np.arange(eigvec.shape[1])])
+    scores = eigvec * np.sqrt(eigval[:n_components])
+    return scores, eigval[:n_components] / eigval.sum()
+
+
+def section3(results_dir, available, out_dir, min_cov=5, top_n_sites=50_000,
+             pca_mode='top', tmpdir=None):
     log.info('=== Section 3: PCA / hierarchical clustering ===')
     cpg_samples = available.get('CpG', [])
     if len(cpg_samples) < 2:
         log.warning('Fewer than 2 CpG samples available — skipping Section 3.')
         return
 
-    frames = []
-    for sample in cpg_samples:
-        fpath = results_dir / 'CpG' / sample / f'{sample}.bedMethyl'
-        log.info(f'  Loading {sample} ...')
-        bm = load_bedmethyl(fpath, usecols=[0, 1, 9, 10])
-        bm = bm[['chrom', 'start', 'N_valid_cov', 'pct_mod']]
-        bm = bm[bm['N_valid_cov'] >= min_cov]
-        bm = bm.rename(columns={'pct_mod': sample})[['chrom', 'start', sample]]
-        frames.append(bm)
-        log.info(f'    {len(bm):,} sites (cov ≥ {min_cov})')
-
-    matrix = reduce(
-        lambda a, b: a.merge(b, on=['chrom', 'start'], how='inner'), frames)
-    log.info(f'  Common sites (all samples, cov ≥ {min_cov}): {len(matrix):,}')
-
-    site_var  = matrix[cpg_samples].var(axis=1)
-    top_sites = site_var.nlargest(min(top_n_sites, len(matrix))).index
-    mat_filt  = matrix.loc[top_sites, cpg_samples]
-    log.info(f'  Top {len(mat_filt):,} most variable sites retained')
-
-    X = mat_filt.T.values     # (n_samples × n_sites)
-
-    # PCA
-    pca   = PCA(n_components=min(len(cpg_samples), 3))
-    X_sc  = StandardScaler().fit_transform(X)
-    X_pca = pca.fit_transform(X_sc)
-    var_exp = pca.explained_variance_ratio_ * 100
+    n_comp = min(len(cpg_samples), 3)
+    rng    = np.random.default_rng(0)
+    if pca_mode == 'full':
+        # All common sites, streamed from a float32 memmap
+        X = common_site_matrix(results_dir, cpg_samples, Path(tmpdir), min_cov)
+        log.info(f'  Common sites (all samples, cov ≥ {min_cov}): {X.shape[1]:,}')
+        X_pca, var_exp = streamed_pca(X, n_comp)
+        var_exp *= 100
+        site_desc = f'all {X.shape[1]:,} common sites'
+        hm_idx = np.sort(rng.choice(X.shape[1], min(10_000, X.shape[1]), replace=False))
+        hm_mat = pd.DataFrame(np.asarray(X[:, hm_idx]).T, columns=cpg_samples)
+        hm_desc = f'{len(hm_idx):,} random sites from {X.shape[1]:,} common'
+        del X
+        for f in Path(tmpdir).glob('*pca_*.npy'):
+            f.unlink()
+    else:
+        frames = []
+        for sample in cpg_samples:
+            fpath = results_dir / 'CpG' / sample / f'{sample}.bedMethyl'
+            log.info(f'  Loading {sample} ...')
+            bm = load_bedmethyl(fpath, usecols=[0, 1, 9, 10])
+            bm = bm[['chrom', 'start', 'N_valid_cov', 'pct_mod']]
+            bm = bm[bm['N_valid_cov'] >= min_cov]
+            bm = bm.rename(columns={'pct_mod': sample})[['chrom', 'start', sample]]
+            frames.append(bm)
+            log.info(f'    {len(bm):,} sites (cov ≥ {min_cov})')
+
+        matrix = reduce(
+            lambda a, b: a.merge(b, on=['chrom', 'start'], how='inner'), frames)
+        log.info(f'  Common sites (all samples, cov ≥ {min_cov}): {len(matrix):,}')
+
+        site_var  = matrix[cpg_samples].var(axis=1)
+        top_sites = site_var.nlargest(min(top_n_sites, len(matrix))).index
+        mat_filt  = matrix.loc[top_sites, cpg_samples]
+        log.info(f'  Top {len(mat_filt):,} most variable sites retained')
+
+        X = mat_filt.T.values     # (n_samples × n_sites)
+
+        # PCA
+        pca   = PCA(n_components=n_comp)
+        X_sc  = StandardScaler().fit_transform(X)
+        X_pca = pca.fit_transform(X_sc)
+        var_exp = pca.explained_variance_ratio_ * 100
+        site_desc = f'top {len(mat_filt):,} variable sites'
+        hm_idx = rng.choice(len(mat_filt),
+                            min(10_000, len(mat_filt)), replace=False)
+        hm_mat = mat_filt.iloc[hm_idx]
+        hm_desc = f'{len(hm_idx):,} random sites from top {len(mat_filt):,} variable'
+
     log.info('  Explained variance: ' +
              '  '.join(f'PC{i+1}: {v:.1f}%' for i, v in enumerate(var_exp)))
 
@@ -385,9 +488,9 @@ def section3(results_dir, available, out_dir, min_cov=5, top_n_sites=50_000):
                     (X_pca[i, 0], X_pca[i, 1]),
                     textcoords='offset points', xytext=(8, 4), fontsize=9)
     ax.set_xlabel(f'PC1 ({var_exp[0]:.1f}%)')
-    ax.set_ylabel(f'PC2 ({var_exp[1]:.1f}%)' if pca.n_components_ > 1 else 'PC2')
+    ax.set_ylabel(f'PC2 ({var_exp[1]:.1f}%)' if n_comp > 1 else 'PC2')
     ax.set_title(f'PCA of CpG methylation\n'
-                 f'(top {len(mat_filt):,} variable sites, cov ≥ {min_cov})')
+                 f'({site_desc}, cov ≥ {min_cov})')
     ax.axhline(0, color='grey', linewidth=0.5, linestyle='--')
     ax.axvline(0, color='grey', linewidth=0.5, linestyle='--')
     sns.despine(ax=ax)
@@ -400,11 +503,6 @@ def section3(results_dir, available, out_dir, min_cov=5, top_n_sites=50_000):
     log.info(f'  Saved: {out}')
 
     # Clustermap
-    rng    = np.random.default_rng(0)
-    hm_idx = rng.choice(len(mat_filt),
-                        min(10_000, len(mat_filt)), replace=False)
-    hm_mat = mat_filt.iloc[hm_idx]
-
     cg = sns.clustermap(
         hm_mat.T,
         col_cluster=True,
@@ -418,7 +516,7 @@ def section3(results_dir, available, out_dir, min_cov=5, top_n_sites=50_000):
     )
     cg.fig.suptitle(
         f'Hierarchical clustering — CpG methylation\n'
-        f'({len(hm_idx):,} random sites from top {len(mat_filt):,} variable)',
+        f'({hm_desc})',
         y=1.02,
     )
     out = out_dir / 'fig3b_clustermap.pdf'
@@ -540,13 +638,273 @@ def section4(allC_data, allC_ctx, out_dir, sample_order):
     log.info(f'  Saved: {out}')
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Section 5 — Genome-wide window methylation tracks
+# ─────────────────────────────────────────────────────────────────────────────
+
+def window_offsets(chrom_lengths, window):
+    """Global index of the first window of every chromosome, and the window total."""
+    n_windows = np.array([-(-length // window) for length in chrom_lengths.values()], dtype=np.int64)
+    offsets   = np.concatenate([[0], np.cumsum(n_windows)[:-1]])
+    return dict(zip(chrom_lengths, offsets)), n_windows, int(n_windows.sum())
+
+
+def fine_window_sums(df, chrom_lengths, fine):
+    """ΣN_mod and ΣN_valid_cov per fine window, genome-wide, in one bincount each."""
+    offsets, _, n_bins = window_offsets(chrom_lengths, fine)
+    off  = df['chrom'].map(offsets)
+    keep = off.notna().to_numpy()
+    idx  = off.to_numpy()[keep].astype(np.int64) + df['start'].to_numpy()[keep] // fine
+    mod  = np.bincount(idx, weights=df['N_mod'].to_numpy()[keep], minlength=n_bins)
+    cov  = np.bincount(idx, weights=df['N_valid_cov'].to_numpy()[keep], minlength=n_bins)
+    return mod.astype(np.uint32), cov.astype(np.uint32), int((~keep).sum())
+
+
+def coarsen_windows(fine_sums, chrom_lengths, fine, window):
+    """Sum fine-window rows (n_fine × tracks) into `window`-sized rows per chromosome."""
+    _, n_fine_per_chr, n_fine = window_offsets(chrom_lengths, fine)
+    coarse_off, _, n_coarse   = window_offsets(chrom_lengths, window)
+    chrom_idx = np.repeat(np.arange(len(chrom_lengths)), n_fine_per_chr)
+    local     = np.arange(n_fine) - np.repeat(np.cumsum(n_fine_per_chr) - n_fine_per_chr, n_fine_per_chr)
+    target    = np.array(list(coarse_off.values()), dtype=np.int64)[chrom_idx] + local // (window // fine)
+    return np.column_stack([
+        np.bincount(target, weights=fine_sums[:, j], minlength=n_coarse)
+        for j in range(fine_sums.shape[1])
+    ]).astype(np.uint32)
+
+
+def section5(results_dir, available, allC_ctx, ref_fasta, out_dir, sample_order,
+             window_sizes=(1_000, 10_000, 100_000)):
+    log.info('=== Section 5: Genome-wide window methylation ===')
+    window_sizes = sorted(set(window_sizes))
+    fine = window_sizes[0]
+    if any(w % fine for w in window_sizes):
+        raise ValueError(f'Window sizes {window_sizes} must all be multiples of {fine}')
+    if not available.get('CpG') and not allC_ctx:
+        log.warning('No CpG or allC data available — skipping Section 5.')
+        return {}
+
+    genome = pyfaidx.Fasta(str(ref_fasta), build_index=False)
+    chrom_lengths = {name: len(rec) for name, rec in genome.items()}
+
+    # one pass per file at the finest window; tracks are "{sample}|{context}"
+    tracks, mods, covs = [], [], []
+
+    def add_track(name, df):
+        mod, cov, dropped = fine_window_sums(df, chrom_lengths, fine)
+        tracks.append(name)
+        mods.append(mod)
+        covs.append(cov)
+        log.info(f'  {name}: {len(df) - dropped:,} sites binned'
+                 + (f' ({dropped:,} on contigs missing from the reference)' if dropped else ''))
+
+    for sample in [s for s in sample_order if s in available.get('CpG', [])]:
+        fpath = results_dir / 'CpG' / sample / f'{sample}.bedMethyl'
+        log.info(f'  Loading {sample} (CpG) ...')
+        add_track(f'{sample}|CpG', load_bedmethyl(fpath, usecols=[0, 1, 9, 11]))
+    for sample in [s for s in sample_order if s in allC_ctx]:
+        for ctx, grp in allC_ctx[sample].groupby('context'):
+            add_track(f'{sample}|allC_{ctx}', grp)
+
+    fine_mod, fine_cov = np.column_stack(mods), np.column_stack(covs)
+    arrays = {
+        'tracks': np.array(tracks),
+        'chroms': np.array(list(chrom_lengths)),
+        'chrom_lengths': np.array(list(chrom_lengths.values()), dtype=np.int64),
+        'window_sizes': np.array(window_sizes, dtype=np.int64),
+    }
+    for w in window_sizes:
+        _, n_per_chr, _ = window_offsets(chrom_lengths, w)
+        arrays[f'w{w}_chrom'] = np.repeat(np.arange(len(chrom_lengths)), n_per_chr).astype(np.int32)
+        arrays[f'w{w}_start'] = np.concatenate([np.arange(n) * w for n in n_per_chr]).astype(np.int64)
+        arrays[f'w{w}_mod'] = fine_mod if w == fine else coarsen_windows(fine_mod, chrom_lengths, fine, w)
+        arrays[f'w{w}_cov'] = fine_cov if w == fine else coarsen_windows(fine_cov, chrom_lengths, fine, w)
+        log.info(f'  {w:,} bp: {len(arrays[f"w{w}_start"]):,} windows × {len(tracks)} tracks')
+
+    out = out_dir / 'window_methylation.npz'
+    np.savez_compressed(out, **arrays)
+    log.info(f'  Saved: {out}')
+
+    # ── fig5: methylation along the main chromosomes (coarsest windows) ───────
+    w = window_sizes[-1]
+    ctx_label = 'CpG' if any(t.endswith('|CpG') for t in tracks) else 'allC_CG'
+    plot_tracks = [(i, t.split('|')[0]) for i, t in enumerate(tracks) if t.endswith(f'|{ctx_label}')]
+    chroms = [c for c in chrom_lengths if c.startswith('NC_')] or \
+             sorted(chrom_lengths, key=chrom_lengths.get, reverse=True)[:10]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        level = arrays[f'w{w}_mod'] / arrays[f'w{w}_cov'] * 100
+
+    fig, axes = plt.subplots(len(chroms), 1, figsize=(12, 1.4 * len(chroms) + 1),
+                             sharex=True, squeeze=False)
+    chrom_names = list(chrom_lengths)
+    for ax, chrom in zip(axes[:, 0], chroms):
+        rows = arrays[f'w{w}_chrom'] == chrom_names.index(chrom)
+        x = (arrays[f'w{w}_start'][rows] + w / 2) / 1e6
+        for i, sample in plot_tracks:
+            ax.plot(x, level[rows, i], linewidth=0.7,
+                    color=SAMPLE_META.get(sample, {}).get('color', None),
+                    label=SAMPLE_META.get(sample, {}).get('label', sample).replace('\n', ' '))
+        ax.set_ylim(0, 100)
+        ax.set_ylabel(chrom, rotation=0, ha='right', va='center', fontsize=8)
+        ax.yaxis.set_major_formatter(mticker.PercentFormatter())
+        ax.tick_params(axis='y', labelsize=7)
+        sns.despine(ax=ax)
+    axes[-1, 0].set_xlabel('Position (Mb)')
+    axes[0, 0].legend(frameon=False, fontsize=8, ncol=len(plot_tracks), loc='lower right')
+    fig.suptitle(f'{ctx_label} methylation along chromosomes ({w // 1000:,} kb windows)', y=1.0)
+    plt.tight_layout()
+    out = out_dir / 'fig5_window_methylation_tracks.pdf'
+    plt.savefig(out, bbox_inches='tight')
+    svg_out = out_dir / 'fig5_window_methylation_tracks.svg'
+    plt.savefig(svg_out, bbox_inches='tight')
+    plt.close()
+    log.info(f'  Saved: {out}')
+
+    return arrays
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Section 6 — Metagene profiles around TSS / TES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def metagene_bins(site_chrom, site_pos, gene_bed, flank_bp, n_flank, n_body,
+                  max_pairs=20_000_000):
+    """
+    Yield (site indices, metagene bins) for every site within flank_bp of a gene.
+
+    Bins run 5' → 3' on the gene's strand: n_flank upstream bins, n_body bins
+    scaled to the gene length, n_flank downstream bins. Sites are sorted once
+    on a (chrom code, position) int64 key; each gene's flank-extended interval
+    is a contiguous run of that order (searchsorted), and the gene/site pairs
+    are expanded with np.repeat in batches of at most max_pairs pairs.
+    A site near several genes is counted once per gene.
+
+    Chrom codes follow first appearance, so a coordinate-sorted bedMethyl is
+    already in key order and the stable sort is a linear pass.
+    """
+    codes, chroms = pd.factorize(site_chrom)
+    site_pos  = np.asarray(site_pos, dtype=np.int64)
+    site_key  = (codes.astype(np.int64) << 32) | site_pos
+    order     = np.argsort(site_key, kind='stable')
+    site_key  = site_key[order]
+
+    g_code  = pd.Index(chroms).get_indexer(gene_bed['chrom'].values).astype(np.int64)
+    g_start = gene_bed['start'].values.astype(np.int64)
+    g_end   = gene_bed['end'].values.astype(np.int64)
+    g_minus = gene_bed['strand'].values == '-'
+    lo = np.searchsorted(site_key, (g_code << 32) | np.maximum(0, g_start - flank_bp), side='left')
+    hi = np.searchsorted(site_key, (g_code << 32) | (g_end + flank_bp), side='left')
+    counts = np.where(g_code >= 0, hi - lo, 0)       # genes on contigs without sites
+    if not counts.sum():
+        return
+
+    csum = np.cumsum(counts)
+    cuts = np.searchsorted(csum, np.arange(max_pairs, csum[-1], max_pairs), side='right')
+    for g0, g1 in zip(np.r_[0, cuts], np.r_[cuts, len(counts)]):
+        c = counts[g0:g1]
+        if g0 == g1 or not c.sum():
+            continue
+        gid    = np.repeat(np.arange(g0, g1), c)
+        within = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        sidx   = order[lo[gid] + within]
+        pos    = site_pos[sidx]
+        length = g_end[gid] - g_start[gid]
+        rel    = np.where(g_minus[gid], g_end[gid] - 1 - pos, pos - g_start[gid])
+        bins   = np.where(rel < 0, (rel + flank_bp) * n_flank // flank_bp,
+                 np.where(rel < length, n_flank + rel * n_body // np.maximum(length, 1),
+                          n_flank + n_body + (rel - length) * n_flank // flank_bp))
+        yield sidx, np.clip(bins, 0, 2 * n_flank + n_body - 1)
+
+
+def section6(results_dir, available, allC_ctx, ref_gff, out_dir, sample_order,
+             flank_bp=2000, n_flank=20, n_body=40):
+    log.info('=== Section 6: Metagene profiles ===')
+    if not available.get('CpG') and not allC_ctx:
+        log.warning('No CpG or allC data available — skipping Section 6.')
+        return pd.DataFrame()
+
+    gene_bed = load_gene_bed(ref_gff)
+    gene_bed = gene_bed[gene_bed['start'] < gene_bed['end']].reset_index(drop=True)
+    n_bins   = 2 * n_flank + n_body
+    region   = np.array(['upstream'] * n_flank + ['gene_body'] * n_body + ['downstream'] * n_flank)
+    log.info(f'  {len(gene_bed):,} genes | ±{flank_bp:,} bp flanks | '
+             f'{n_flank}+{n_body}+{n_flank} bins')
+
+    records = []
+
+    def add_profile(sample, context, df):
+        mod = np.zeros(n_bins)
+        cov = np.zeros(n_bins)
+        n_mod, n_cov = df['N_mod'].to_numpy(), df['N_valid_cov'].to_numpy()
+        for sidx, bins in metagene_bins(df['chrom'], df['start'].to_numpy(),
+                                        gene_bed, flank_bp, n_flank, n_body):
+            mod += np.bincount(bins, weights=n_mod[sidx], minlength=n_bins)
+            cov += np.bincount(bins, weights=n_cov[sidx], minlength=n_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pct = mod / cov * 100
+        records.append(pd.DataFrame({
+            'sample': sample, 'context': context, 'bin': np.arange(n_bins),
+            'region': region, 'N_mod': mod.astype(np.int64),
+            'N_valid_cov': cov.astype(np.int64), 'pct_mod': pct,
+        }))
+        log.info(f'  {sample} {context}: {int(cov.sum()):,} calls in metagene bins')
+
+    for sample in [s for s in sample_order if s in available.get('CpG', [])]:
+        fpath = results_dir / 'CpG' / sample / f'{sample}.bedMethyl'
+        log.info(f'  Loading {sample} (CpG) ...')
+        add_profile(sample, 'CpG', load_bedmethyl(fpath, usecols=[0, 1, 9, 11],
+                                                  extra_dtypes={'chrom': 'category'}))
+    for sample in [s for s in sample_order if s in allC_ctx]:
+        for ctx, grp in allC_ctx[sample].groupby('context'):
+            add_profile(sample, f'allC_{ctx}', grp)
+
+    profile = pd.concat(records, ignore_index=True)
+    out = out_dir / 'metagene_profile.tsv'
+    profile.to_csv(out, sep='\t', index=False, float_format='%.4f')
+    log.info(f'  Saved: {out}')
+
+    # ── fig6: one panel per context, one line per sample ──────────────────────
+    contexts = [c for c in ['CpG', 'allC_CG', 'allC_CHG', 'allC_CHH']
+                if c in set(profile['context'])]
+    fig, axes = plt.subplots(1, len(contexts), figsize=(4.5 * len(contexts), 4),
+                             squeeze=False)
+    for ax, ctx in zip(axes[0], contexts):
+        for sample in sample_order:
+            sub = profile[(profile['sample'] == sample) & (profile['context'] == ctx)]
+            if sub.empty:
+                continue
+            ax.plot(sub['bin'] + 0.5, sub['pct_mod'], linewidth=1.2,
+                    color=SAMPLE_META.get(sample, {}).get('color', None),
+                    label=SAMPLE_META.get(sample, {}).get('label', sample).replace('\n', ' '))
+        for x in (n_flank, n_flank + n_body):
+            ax.axvline(x, color='grey', linewidth=0.6, linestyle='--')
+        ax.set_xticks([0, n_flank, n_flank + n_body, n_bins])
+        ax.set_xticklabels([f'-{flank_bp / 1000:g} kb', 'TSS', 'TES', f'+{flank_bp / 1000:g} kb'])
+        ax.set_xlim(0, n_bins)
+        ax.set_title(ctx.replace('allC_', '') + (' (allC)' if ctx.startswith('allC_') else ''))
+        ax.set_ylabel('Methylation (%)' if ax is axes[0, 0] else '')
+        ax.yaxis.set_major_formatter(mticker.PercentFormatter())
+        sns.despine(ax=ax)
+    axes[0, 0].legend(frameon=False, fontsize=8)
+    fig.suptitle(f'Metagene methylation profiles ({len(gene_bed):,} genes)', y=1.02, fontsize=13)
+    plt.tight_layout()
+    out = out_dir / 'fig6_metagene_profile.pdf'
+    plt.savefig(out, bbox_inches='tight')
+    svg_out = out_dir / 'fig6_metagene_profile.svg'
+    plt.savefig(svg_out, bbox_inches='tight')
+    plt.close()
+    log.info(f'  Saved: {out}')
+
+    return profile
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Main
 # ─────────────────────────────────────────────────────────────────────────────
 
 def parse_args():
     p = argparse.ArgumentParser(
-        description='Methylation landscape EDA (headless, all 4 sections).')
+        description='Methylation landscape EDA (headless, all 6 sections).')
     p.add_argument('--wdir', default='/home/daffa/Work/2026/02-JSPP67',
                    help='Project root directory (default: %(default)s)')
     p.add_argument('--ref-fasta', default=None,
@@ -566,9 +924,22 @@ def parse_args():
                    help='Minimum coverage for PCA matrix (default: 5)')
     p.add_argument('--top-n-sites', type=int, default=50_000,
                    help='Most variable CpG sites to retain for PCA (default: 50000)')
+    p.add_argument('--pca-mode', choices=['top', 'full'], default='top',
+                   help="Section 3 PCA over the --top-n-sites most variable sites ('top', in memory) "
+                        "or over all common sites streamed from a float32 memmap ('full') "
+                        "(default: top)")
     p.add_argument('--promoter-bp', type=int, default=2000,
                    help='Promoter window upstream of TSS in bp (default: 2000)')
-    return p.parse_args()
+    p.add_argument('--window-sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                   help='Window sizes in bp for Section 5, multiples of the smallest '
+                        '(default: 1000 10000 100000)')
+    p.add_argument('--metagene-flank-bp', type=int, default=2000,
+                   help='Up- and downstream flank of the Section 6 metagene in bp (default: 2000)')
+    args = p.parse_args()
+    if min(args.window_sizes) < 1 or any(w % min(args.window_sizes) for w in args.window_sizes):
+        p.error(f'--window-sizes must be positive multiples of the smallest size, '
+                f'got {args.window_sizes}')
+    return args
 
 
 def main():
@@ -589,6 +960,8 @@ def main():
     log.info(f'SAMPLES     : {args.samples}')
     log.info(f'CONTEXTS    : {args.contexts}')
 
+    SAMPLE_META.update(sample_style(args.samples))
+
     available = discover_available(results_dir, args.samples, args.contexts)
     for ctx, slist in available.items():
         log.info(f'  {ctx}: {slist}')
@@ -607,11 +980,20 @@ def main():
 
     # Section 3
     section3(results_dir, available, out_dir,
-             min_cov=args.min_cov, top_n_sites=args.top_n_sites)
+             min_cov=args.min_cov, top_n_sites=args.top_n_sites,
+             pca_mode=args.pca_mode, tmpdir=tmpdir)
 
     # Section 4
     section4(allC_data, allC_ctx, out_dir, args.samples)
 
+    # Section 5
+    section5(results_dir, available, allC_ctx, ref_fasta, out_dir, args.samples,
+             window_sizes=args.window_sizes)
+
+    # Section 6
+    section6(results_dir, available, allC_ctx, ref_gff, out_dir, args.samples,
+             flank_bp=args.metagene_flank_bp)
+
     log.info('Done. All figures written to: %s', out_dir)
 
 
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+plan_regions.py
+───────────────
+Pack the contigs of a reference (samtools faidx .fai) into N region BED
+files of similar total length, one Clair3 job per BED (--bed_fn).
+
+Contigs are first cut into equal pieces no longer than a fraction of the
+per-shard target (total length / N / --pieces-per-shard), so a few large
+chromosomes do not dominate one shard; unplaced scaffolds fill up the
+lightest shards. Pieces are assigned longest first to the currently
+lightest shard, and each BED is written in .fai order with adjacent pieces
+of a contig merged back into one region.
+
+BED columns: chrom, start (0-based), end
+
+Usage:
+  python plan_regions.py reference.fa.fai 8 out_dir/
+  python plan_regions.py reference.fa.fai 8 out_dir/ --pieces-per-shard 16
+  python plan_regions.py reference.fa.fai 8 out_dir/ --no-split
+"""
+
+import argparse
+import heapq
+import math
+import sys
+from pathlib import Path
+
+
+def read_fai(path):
+    """[(contig, length)] in .fai order."""
+    contigs = []
+    with open(path) as fh:
+        for line in fh:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) >= 2 and fields[0]:
+                contigs.append((fields[0], int(fields[1])))
+    return contigs
+
+
+def split_contigs(contigs, max_length):
+    """[(order, contig, start, end)]: every contig in ≤ max_length equal pieces."""
+    pieces = []
+    for order, (contig, length) in enumerate(contigs):
+        n = max(1, math.ceil(length / max_length)) if max_length else 1
+        bounds = [round(i * length / n) for i in range(n + 1)]
+        pieces.extend((order, contig, bounds[i], bounds[i + 1]) for i in range(n))
+    return pieces
+
+
+def merge_adjacent(pieces):
+    """Sorted [(order, contig, start, end)] → [(contig, start, end)], touching pieces joined."""
+    regions = []
+    for _, contig, start, end in pieces:
+        if regions and regions[-1][0] == contig and regions[-1][2] == start:
+            regions[-1] = (contig, regions[-1][1], end)
+        else:
+            regions.append((contig, start, end))
+    return regions
+
+
+def plan_regions(contigs, n_shards, pieces_per_shard=8, split=True):
+    """
+    Assign the (pieces of the) contigs to n_shards shards, longest first to
+    the lightest shard. Returns one sorted [(contig, start, end)] per shard.
+    """
+    total = sum(length for _, length in contigs)
+    max_length = math.ceil(total / (n_shards * pieces_per_shard)) if split else 0
+    pieces = split_contigs(contigs, max_length)
+    if len(pieces) < n_shards:
+        raise ValueError(f"{len(pieces)} regions cannot fill {n_shards} shards")
+
+    heap = [(0, shard) for shard in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    for piece in sorted(pieces, key=lambda p: p[3] - p[2], reverse=True):
+        load, shard = heapq.heappop(heap)
+        shards[shard].append(piece)
+        heapq.heappush(heap, (load + piece[3] - piece[2], shard))
+
+    return [merge_adjacent(sorted(shard)) for shard in shards]
+
+
+def shard_name(i):
+    return f"shard_{i:03d}.bed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Length-balanced region BEDs for sharded Clair3 calling")
+    parser.add_argument("fai", help="samtools faidx index of the reference")
+    parser.add_argument("n_shards", type=int, help="number of BED shards")
+    parser.add_argument("out_dir", help="output directory (shard_NNN.bed)")
+    parser.add_argument("--pieces-per-shard", type=int, default=8,
+                        help="contig pieces per shard; more pieces = better balance (default: 8)")
+    parser.add_argument("--no-split", action="store_true",
+                        help="keep every contig whole (fewer boundaries, less balance)")
+    args = parser.parse_args()
+
+    if args.n_shards < 1 or args.pieces_per_shard < 1:
+        parser.error("n_shards and --pieces-per-shard must be at least 1")
+
+    shards = plan_regions(read_fai(args.fai), args.n_shards, args.pieces_per_shard, split=not args.no_split)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for i, regions in enumerate(shards):
+        with open(out_dir / shard_name(i), "w") as fh:
+            for contig, start, end in regions:
+                fh.write(f"{contig}\t{start}\t{end}\n")
+
+    loads = [sum(e - s for _, s, e in regions) for regions in shards]
+    print(f"[plan_regions] {args.n_shards} shards of {min(loads):,}–{max(loads):,} bp → {out_dir}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+vcf_stats.py
+────────────
+Summary statistics of a (multi-sample) VCF in one streaming pass.
+
+The VCF body is read in blocks of --chunk-size records (pandas read_csv);
+every block is reduced with vectorised string/NumPy operations and added
+to fixed-size accumulators, so memory use depends on the number of
+samples, histogram bins and genome windows, not on the size of the VCF.
+
+Output tables (in out_dir):
+  per_sample.tsv      SNPs, indels, transitions, transversions, Ts/Tv,
+                      het / hom-alt / missing genotypes per sample
+  concordance.tsv     per sample pair: sites called in both, identical
+                      genotypes, shared and union variant sites (Jaccard)
+  qual_hist.tsv       QUAL distribution of all records
+  dp_hist.tsv         FORMAT/DP distribution per sample at its variant sites
+  window_density.tsv  variant sites per window (--window bp) and sample
+
+A site counts as a variant of a sample when its GT carries an ALT allele.
+SNP: REF and every ALT are single bases; everything else is an indel.
+
+Usage:
+  python vcf_stats.py all_strains_merged.vcf.gz out_dir/
+  python vcf_stats.py all_strains_merged.vcf.gz out_dir/ --window 50000 --chunk-size 200000
+"""
+
+import argparse
+import csv
+import gzip
+import itertools
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+QUAL_BINS = np.append(np.arange(0, 255, 5), np.inf)     # 0-5, …, 250-inf
+DP_BINS   = np.append(np.arange(0, 202, 2), np.inf)     # 0-2, …, 200-inf
+TRANSITIONS = {"AG", "GA", "CT", "TC"}
+
+
+def read_header(path):
+    """(number of header lines, sample names, {contig: length}) of a VCF."""
+    contigs = {}
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt") as fh:
+        for n, line in enumerate(fh, start=1):
+            if line.startswith("##contig=<"):
+                fields = dict(kv.split("=", 1) for kv in line.strip()[10:-1].split(",") if "=" in kv)
+                if "length" in fields:
+                    contigs[fields["ID"]] = int(fields["length"])
+            elif line.startswith("#CHROM"):
+                return n, line.rstrip("\n").split("\t")[9:], contigs
+    raise ValueError(f"{path}: no #CHROM header line")
+
+
+def normalize_gt(gt):
+    """'1|0' → '0/1', './.' → '' (missing); vectorised over a Series."""
+    alleles = gt.str.replace("|", "/", regex=False).str.split("/", expand=True)
+    if alleles.shape[1] == 1:
+        alleles[1] = alleles[0]                     # haploid calls
+    a, b = alleles[0].fillna("."), alleles[1].fillna(alleles[0]).fillna(".")
+    low, high = np.where(a <= b, a, b), np.where(a <= b, b, a)
+    missing = (a == ".") | (b == ".")
+    return pd.Series(np.where(missing, "", pd.Series(low) + "/" + pd.Series(high)), index=gt.index)
+
+
+def format_field(format_col, sample_col, key):
+    """Value of FORMAT `key` for every row ('' when absent), grouping rows by FORMAT string."""
+    values = pd.Series("", index=sample_col.index)
+    for fmt, rows in format_col.groupby(format_col).groups.items():
+        keys = fmt.split(":")
+        if key in keys:
+            idx = keys.index(key)
+            values.loc[rows] = sample_col.loc[rows].str.split(":").str[idx].fillna("")
+    return values
+
+
+class VcfStats:
+    def __init__(self, samples, contigs, window):
+        self.samples = samples
+        self.window = window
+        n = len(samples)
+        self.counts = {k: np.zeros(n, dtype=np.int64) for k in
+                       ("snps", "indels", "transitions", "transversions", "het", "hom_alt", "missing")}
+        self.pairs = list(itertools.combinations(range(n), 2))
+        self.pair_counts = {k: np.zeros(len(self.pairs), dtype=np.int64) for k in
+                            ("both_called", "identical_gt", "shared_variants", "union_variants")}
+        self.qual_hist = np.zeros(len(QUAL_BINS) - 1, dtype=np.int64)
+        self.dp_hist = np.zeros((len(DP_BINS) - 1, n), dtype=np.int64)
+        self.contigs = contigs
+        self.density = {}                           # contig → (n_windows, 1 + n_samples)
+        self.n_records = 0
+
+    def _density(self, contig, max_pos):
+        n_windows = max(self.contigs.get(contig, 0), max_pos + 1) // self.window + 1
+        arr = self.density.get(contig)
+        if arr is None or arr.shape[0] < n_windows:
+            grown = np.zeros((n_windows, 1 + len(self.samples)), dtype=np.int64)
+            if arr is not None:
+                grown[:arr.shape[0]] = arr
+            self.density[contig] = arr = grown
+        return arr
+
+    def add(self, block):
+        self.n_records += len(block)
+        ref, alt = block["REF"], block["ALT"]
+        alt_lengths = alt.str.split(",").apply(lambda alts: max(len(a) for a in alts))
+        is_snp = ((ref.str.len() == 1) & (alt_lengths == 1) & ~alt.str.contains(r"[*<]", regex=True)).to_numpy()
+        is_ts = is_snp & (ref + alt.str[0]).isin(TRANSITIONS).to_numpy()
+        is_tv = is_snp & ~is_ts
+
+        qual = pd.to_numeric(block["QUAL"], errors="coerce").to_numpy()
+        self.qual_hist += np.histogram(qual[~np.isnan(qual)], QUAL_BINS)[0]
+
+        gts, has_alt = [], []
+        for i, sample in enumerate(self.samples):
+            gt = normalize_gt(block[sample].str.split(":", n=1).str[0])
+            carries = gt.str.contains(r"[1-9]", regex=True).to_numpy()
+            called = (gt != "").to_numpy()
+            gts.append(gt.to_numpy())
+            has_alt.append(carries)
+
+            c = self.counts
+            c["snps"][i] += (carries & is_snp).sum()
+            c["indels"][i] += (carries & ~is_snp).sum()
+            c["transitions"][i] += (carries & is_ts).sum()
+            c["transversions"][i] += (carries & is_tv).sum()
+            alleles = gt.str.split("/", n=1, expand=True).reindex(columns=[0, 1])
+            het = (alleles[0] != alleles[1]).to_numpy()
+            c["het"][i] += (carries & het).sum()
+            c["hom_alt"][i] += (carries & ~het).sum()
+            c["missing"][i] += (~called).sum()
+
+            dp = pd.to_numeric(format_field(block["FORMAT"], block[sample], "DP"), errors="coerce").to_numpy()
+            self.dp_hist[:, i] += np.histogram(dp[carries & ~np.isnan(dp)], DP_BINS)[0]
+
+        for k, (a, b) in enumerate(self.pairs):
+            both = (gts[a] != "") & (gts[b] != "")
+            p = self.pair_counts
+            p["both_called"][k] += both.sum()
+            p["identical_gt"][k] += (both & (gts[a] == gts[b])).sum()
+            p["shared_variants"][k] += (has_alt[a] & has_alt[b]).sum()
+            p["union_variants"][k] += (has_alt[a] | has_alt[b]).sum()
+
+        any_alt = np.logical_or.reduce(has_alt) if has_alt else np.ones(len(block), dtype=bool)
+        columns = np.column_stack([any_alt] + has_alt).astype(np.int64)
+        pos = block["POS"].astype(np.int64).to_numpy() - 1
+        chrom = block["CHROM"].to_numpy()
+        for contig in pd.unique(chrom):
+            rows = chrom == contig
+            windows = pos[rows] // self.window
+            arr = self._density(contig, int(pos[rows].max()))
+            np.add.at(arr, windows, columns[rows])
+
+    def write(self, out_dir):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        per_sample = pd.DataFrame(self.counts, index=pd.Index(self.samples, name="sample"))
+        per_sample["ts_tv"] = (per_sample["transitions"] / per_sample["transversions"].replace(0, np.nan)).round(3)
+        per_sample.to_csv(out_dir / "per_sample.tsv", sep="\t")
+
+        conc = pd.DataFrame(self.pair_counts)
+        conc.insert(0, "sample_a", [self.samples[a] for a, _ in self.pairs])
+        conc.insert(1, "sample_b", [self.samples[b] for _, b in self.pairs])
+        conc["concordance"] = (conc["identical_gt"] / conc["both_called"].replace(0, np.nan)).round(4)
+        conc["jaccard"] = (conc["shared_variants"] / conc["union_variants"].replace(0, np.nan)).round(4)
+        conc.to_csv(out_dir / "concordance.tsv", sep="\t", index=False)
+
+        pd.DataFrame({"bin_start": QUAL_BINS[:-1], "bin_end": QUAL_BINS[1:], "count": self.qual_hist}) \
+            .to_csv(out_dir / "qual_hist.tsv", sep="\t", index=False)
+
+        dp = pd.DataFrame(self.dp_hist, columns=self.samples)
+        dp.insert(0, "bin_start", DP_BINS[:-1])
+        dp.insert(1, "bin_end", DP_BINS[1:])
+        dp.to_csv(out_dir / "dp_hist.tsv", sep="\t", index=False)
+
+        with open(out_dir / "window_density.tsv", "w") as fh:
+            fh.write("\t".join(["chrom", "start", "end", "all"] + self.samples) + "\n")
+            for contig, arr in self.density.items():
+                length = self.contigs.get(contig, arr.shape[0] * self.window)
+                for w, row in enumerate(arr):
+                    start = w * self.window
+                    if start >= length:
+                        break
+                    fh.write(f"{contig}\t{start}\t{min(start + self.window, length)}\t"
+                             + "\t".join(map(str, row)) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming summary statistics of a multi-sample VCF")
+    parser.add_argument("vcf", help="VCF, plain or bgzipped")
+    parser.add_argument("out_dir", help="output directory of the summary tables")
+    parser.add_argument("--window", type=int, default=100_000, help="window size in bp for variant density (default: 100000)")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="VCF records per block (default: 100000)")
+    args = parser.parse_args()
+
+    n_header, samples, contigs = read_header(args.vcf)
+    columns = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples
+    stats = VcfStats(samples, contigs, args.window)
+
+    reader = pd.read_csv(
+        args.vcf, sep="\t", header=None, names=columns, skiprows=n_header,
+        usecols=["CHROM", "POS", "REF", "ALT", "QUAL", "FORMAT"] + samples,
+        dtype=str, na_filter=False, quoting=csv.QUOTE_NONE, chunksize=args.chunk_size,
+    )
+    for block in reader:
+        stats.add(block)
+
+    stats.write(args.out_dir)
+    print(f"[vcf_stats] {stats.n_records:,} records, {len(samples)} samples → {args.out_dir}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()